@@ -0,0 +1,84 @@
+# tests.test_parsing.py
+
+import os
+import unittest
+from unittest import mock
+
+import whois21
+
+# The "key: value" lines of a typical response, with a key whose value is in the
+# next lines(until the next key) and a comment between them
+RESPONSE = (
+    b'Domain Name: EXAMPLE.COM\n'
+    b'Registrar: Example Registrar, Inc.\n'
+    b'Name Server: NS1.EXAMPLE.COM\n'
+    b'Name Server: NS2.EXAMPLE.COM\n'
+    b'Registrant:\n'
+    b'    Example Org\n'
+    b'    1 Example Street\n'
+    b'% This is a comment\n'
+    b'Creation Date: 1995-08-14T04:00:00Z\n'
+)
+EXPECTED = {
+    'DOMAIN NAME': 'EXAMPLE.COM',
+    'REGISTRAR': 'Example Registrar, Inc.',
+    'NAME SERVER': ['NS1.EXAMPLE.COM', 'NS2.EXAMPLE.COM'],
+    'REGISTRANT': 'Example Org\n1 Example Street',
+    'CREATION DATE': '1995-08-14T04:00:00Z'
+}
+
+
+def setUpModule():  # pylint: disable=invalid-name
+    # Nothing is read from or saved to the disk cache
+    patcher = mock.patch.dict(os.environ, {whois21.Cache.TTL_ENV_VAR: '0'})
+    patcher.start()
+    unittest.addModuleCleanup(patcher.stop)
+
+
+def parse(raw: bytes) -> dict:
+    """Parses a WHOIS response the same way `WHOIS` does for the responses of the
+    WHOIS servers.
+
+    :param raw: The raw WHOIS response.
+    :return: The parsed whois data.
+    """
+    whois21.WHOIS.clear_cache()
+    with mock.patch('whois21.query_whois_server', return_value=(raw, None)):
+        whois = whois21.WHOIS('example.com', servers=['whois.example'], use_rdap=False)
+    return whois.whois_data
+
+
+class TestParseWhoisData(unittest.TestCase):
+    """Tests the parsing of the "key: value" lines of the WHOIS responses."""
+
+    def test_lf(self):
+        self.assertEqual(parse(RESPONSE), EXPECTED)
+
+    def test_crlf(self):
+        self.assertEqual(parse(RESPONSE.replace(b'\n', b'\r\n')), EXPECTED)
+
+    def test_cr(self):
+        self.assertEqual(parse(RESPONSE.replace(b'\n', b'\r')), EXPECTED)
+
+    def test_continuation_lines(self):
+        data = parse(
+            b'Registrant:\r\n'
+            b'  Example Org\r\n'
+            b'# comment\r\n'
+            b'  Example Street\r\n'
+            b'Registrar: Example Registrar\r\n'
+        )
+        self.assertEqual(
+            data, {
+                'REGISTRANT': 'Example Org\nExample Street',
+                'REGISTRAR': 'Example Registrar'
+            }
+        )
+
+    def test_empty_value(self):
+        data = parse(b'Registrant:\r\nRegistrar: Example Registrar\r\n')
+        self.assertEqual(data, {'REGISTRANT': '', 'REGISTRAR': 'Example Registrar'})
+
+
+if __name__ == '__main__':
+    unittest.main()
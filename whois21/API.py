@@ -1,12 +1,17 @@
 # whois21.API.py
 
-from typing import Union, Sequence
+import itertools
+from typing import List, Union, Sequence
+from concurrent.futures import ThreadPoolExecutor
 
 import log21
-import requests
 
+from . import HTTP
 from .IP import validate_ip
 
+# The maximum number of ips ip-api.com accepts in a batch request
+BATCH_SIZE = 100
+
 
 def lookup_ip_ip_api(
     ip: str,
@@ -32,7 +37,7 @@ def lookup_ip_ip_api(
 
     log21.debug(f'Looking up {ip} using ip-api.com.')
 
-    return requests.get(
+    return HTTP.get(
         f'http://ip-api.com/json/{ip}?fields={fields}&lang={lang}', timeout=timeout
     ).json()
 
@@ -41,17 +46,22 @@ def batch_lookup_ip_ip_api(
     ips: Sequence[str],
     fields: Union[Sequence[str], str] = '61439',
     lang: str = 'en',
-    timeout: int = 10
-) -> dict:
+    timeout: int = 10,
+    max_workers: int = 4
+) -> List[dict]:
     """Looks up multiple ips using `ip-api.com`.
 
+    ip-api.com accepts up to 100 ips per request, so the ips are split into batches of
+    100 which are sent concurrently.
+
     :param ips: The ips to look up.
     :param fields: The fields to return. See `ip-api.com/docs/api%3abatch` for more
         info.
     :param lang: The language to return the data in. See `ip-api.com/docs/api%3abatch`
         for more info.
     :param timeout: The time-out for the request.
-    :return: A dictionary containing the data.
+    :param max_workers: The maximum number of batches to send at the same time.
+    :return: A list of dictionaries containing the data of each ip in order.
     """
 
     if not isinstance(ips, Sequence):
@@ -62,18 +72,25 @@ def batch_lookup_ip_ip_api(
         if not validate_ip(ip):
             raise ValueError(f'Invalid ip[{i}]: {ip}')
 
-    ips = list(ips)
-
     if isinstance(fields, Sequence) and not isinstance(fields, str):
         fields = ','.join(fields)
 
     if not isinstance(fields, str):
         raise TypeError('`fields` must be a string or a sequence of strings.')
 
-    log21.debug(f'Looking up {ips} using ip-api.com.')
+    iterator = iter(ips)
+    batches = list(iter(lambda: list(itertools.islice(iterator, BATCH_SIZE)), []))
+    if not batches:
+        return []
 
-    return requests.get(
-        f'http://ip-api.com/batch?fields={fields}&lang={lang}',
-        json=ips,
-        timeout=timeout
-    ).json()
+    url = f'http://ip-api.com/batch?fields={fields}&lang={lang}'
+
+    def lookup_batch(batch: List[str]) -> List[dict]:
+        log21.debug(f'Looking up {batch} using ip-api.com.')
+        return HTTP.post(url, json=batch, timeout=timeout).json()
+
+    if len(batches) == 1:
+        return lookup_batch(batches[0])
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        return list(itertools.chain.from_iterable(executor.map(lookup_batch, batches)))
@@ -1,20 +1,25 @@
 # whois21.ASN.py
 
 import os
-import json
-from typing import List, Union, Optional
+import bisect
+import asyncio
+import itertools
+import functools
+import threading
+from typing import Dict, List, Tuple, Union, Iterable, Optional
 
-import log21
-import requests
-import importlib_resources
+from .Cache import get_cached, set_cached
+from .RDAP import fetch_rdap, merge_rdap, select_fields
+from .Bootstrap import download_bootstrap, get_bootstrap_dict
 
 __all__ = [
     'validate_asn', 'download_asn_json', 'get_asn_dict', 'Service', 'get_asn_services',
-    'asn_registration_data_lookup_', 'asn_registration_data_lookup'
+    'find_service_for_asn', 'clear_asn_services_cache', 'asn_registration_data_lookup_',
+    'asn_registration_data_lookup', 'asn_registration_data_lookup_async'
 ]
 
 
-def validate_asn(asn: Union[int, str]) -> Union[int, bool]:
+def _validate_asn(asn: Union[int, str]) -> Union[int, bool]:
     """Validates an Autonomous System Number.
 
     :param asn: The ASN to validate.
@@ -33,8 +38,28 @@ def validate_asn(asn: Union[int, str]) -> Union[int, bool]:
     return False
 
 
+_validate_asn_cached = functools.lru_cache(maxsize=1024, typed=True)(_validate_asn)
+
+
+def validate_asn(asn: Union[int, str]) -> Union[int, bool]:
+    """Validates an Autonomous System Number. The results are cached, so validating the
+    same ASNs again is cheap.
+
+    :param asn: The ASN to validate.
+    :return: An integer if the ASN is valid, False if not.
+    """
+    try:
+        return _validate_asn_cached(asn)
+    except TypeError:
+        # Unhashable objects can't be cached
+        return _validate_asn(asn)
+
+
 def download_asn_json(
-    *, save_path: Optional[Union[str, os.PathLike]] = None, timeout: int = 10
+    *,
+    save_path: Optional[Union[str, os.PathLike]] = None,
+    timeout: int = 10,
+    conditional: bool = False
 ) -> str:
     """Downloads the asn.json file containing the RDAP bootstrap file for Autonomous
     System Number allocations from data.iana.org/rdap/asn.json.
@@ -42,48 +67,33 @@ def download_asn_json(
     :param save_path: The path to save the file to(default: site-
         packages/whois21/asn.json).
     :param timeout: The timeout for the request.
+    :param conditional: If True, the file is only downloaded if it has changed on the
+        server since the last download(using its ETag and modification time).
     :return: The path to the downloaded file.
     """
-
-    if not save_path:
-        save_path = str(importlib_resources.files('whois21') / 'asn.json')
-
-    if not os.path.exists(save_path):
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-
-    log21.debug(f'Downloading asn.json file to {save_path}.')
-
-    with open(save_path, 'wb') as file:
-        file.write(
-            requests.get('https://data.iana.org/rdap/asn.json', timeout=timeout).content
-        )
-
-    return str(save_path)
+    return download_bootstrap(
+        'asn', save_path=save_path, timeout=timeout, conditional=conditional
+    )
 
 
 def get_asn_dict(
     *,
     force_download: bool = False,
-    path: Optional[Union[str, os.PathLike]] = None
+    path: Optional[Union[str, os.PathLike]] = None,
+    max_age: Optional[float] = 86400
 ) -> dict:
     """Returns a dictionary of the asn.json file.
 
     :param force_download: If True, the asn.json file will be downloaded again.
     :param path: The path to the asn.json file.
+    :param max_age: The number of seconds after which the asn.json file is checked for
+        updates. The file is only downloaded again if it has changed on the server.
+        Pass None to never check for updates. (default: 86400)
     :return: A dictionary of the asn.json file.
     """
-
-    if not path:
-        path = str(importlib_resources.files('whois21') / 'asn.json')
-
-    if not os.path.exists(path) or force_download:
-        download_asn_json(save_path=path)
-
-    if os.stat(path).st_size == 0:
-        download_asn_json(save_path=path)
-
-    with open(path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    return get_bootstrap_dict(
+        'asn', force_download=force_download, path=path, max_age=max_age
+    )
 
 
 class Service:
@@ -102,77 +112,137 @@ class Service:
             raise TypeError('`service` must be a List.')
         if len(service) != 2:
             raise ValueError('`service` must be a List containing 2 lists of string.')
+        self.__bounds: List[Tuple[int, int]] = []
+        for range_ in service[0]:
+            low, _, high = range_.partition('-')
+            self.__bounds.append((int(low), int(high or low)))
         self.__ranges: List[range] = [
-            range(*map(int, range_.split('-'))) for range_ in service[0]
+            range(low, high + 1) for low, high in self.__bounds
+        ]
+        # The RDAP URLs end with a slash so the paths can be appended to them
+        self.__addresses: List[str] = [
+            address.rstrip('/') + '/' for address in service[1]
         ]
-        self.__addresses: List[str] = service[1]
 
     @property
     def ranges(self) -> List[range]:
         """Returns a list of ranges."""
         return self.__ranges
 
+    @property
+    def bounds(self) -> List[Tuple[int, int]]:
+        """Returns a list of (first AS number, last AS number) tuples of the ranges."""
+        return self.__bounds
+
     @property
     def addresses(self) -> List[str]:
         """Returns a list of addresses."""
         return self.__addresses
 
     def __iter__(self):
-        for range_ in self.__ranges:
-            for i in range_:
-                yield i
+        return itertools.chain.from_iterable(self.__ranges)
+
+    def __contains__(self, asn: int) -> bool:
+        return any(asn in range_ for range_ in self.__ranges)
 
     def __repr__(self):
         return f'Service(ranges={self.__ranges}, addresses={self.__addresses})'
 
 
+# Maps the path of an asn.json file to the parsed file, its services, and an index of
+# the AS number ranges: the first AS numbers of the ranges in ascending order and the
+# matching (first AS number, last AS number, service) tuples
+_Index = Tuple[List[int], List[Tuple[int, int, Service]]]
+_services_cache: Dict[str, Tuple[dict, List[Service], _Index]] = {}
+_services_lock = threading.Lock()
+
+
+def _load_services(
+    force_download: bool, path: Optional[Union[str, os.PathLike]]
+) -> Tuple[List[Service], _Index]:
+    """Loads the services of an asn.json file and builds the index used to look up the
+    service of an AS number. They are only rebuilt when the file changes. Must be called
+    with `_services_lock` held.
+
+    :param force_download: If True, the asn.json file will be downloaded again.
+    :param path: The path to the asn.json file.
+    :return: The services and the index.
+    """
+    key = str(path)
+    asn = get_asn_dict(force_download=force_download, path=path)
+    cached = _services_cache.get(key)
+    if cached is None or cached[0] is not asn:
+        services = [Service(service) for service in asn.get('services', [])]
+        index = sorted(
+            (
+                (low, high, service) for service in services
+                for low, high in service.bounds
+            ),
+            key=lambda item: item[0]
+        )
+        cached = _services_cache[key] = (
+            asn, services, ([item[0] for item in index], index)
+        )
+    return cached[1], cached[2]
+
+
 def get_asn_services(
     force_download: bool = False,
     path: Optional[Union[str, os.PathLike]] = None
 ) -> List[Service]:
     """Returns the list of services present in the asn.json file.
 
+    The services are cached in memory until the asn.json file changes.
+
     :param force_download: If True, the asn.json file will be downloaded again.
     :param path: The path to the asn.json file.
     :return: The list of services in the asn.json file.
     """
-    asn = get_asn_dict(force_download=force_download, path=path)
-    return [Service(service) for service in asn.get('services', [])]
-
+    with _services_lock:
+        return _load_services(force_download, path)[0]
 
-def _get_rdap(url: str, rdaps: List[dict], timeout: int = 10) -> None:
-    """Gets the RDAP information from a link.
 
-    :param url: The url to get the RDAP information from.
-    :param rdaps: The list to append the RDAP information to.
-    :param timeout: The timeout for the request.
-    :return:
-    """
-    if not url:
-        return
+def find_service_for_asn(asn: int,
+                         path: Optional[Union[str, os.PathLike]
+                                        ] = None) -> Optional[Service]:
+    """Finds the service responsible for an AS number.
 
-    log21.debug(f'Getting domain registration data from {url}.')
+    The AS number ranges in the asn.json file don't overlap, so the service is found
+    with a binary search over the ranges sorted by their first AS number.
 
-    response = requests.get(url, timeout=timeout)
-    response_json = response.json()
-    if response.status_code == 200 and (not response_json.get('errorCode')
-                                        and not response_json.get('error')):
-        if response_json not in rdaps:
-            rdaps.append(response_json)
-
-            # Checks if there is another RDAP link that might have more information.
-            for link in response_json.get('links', []):
-                if link.get('rel') != 'self' and link.get('type'
-                                                          ) == 'application/rdap+json':
-                    _get_rdap(link.get('href'), rdaps, timeout=timeout)
-
-
-def asn_registration_data_lookup_(asn: Union[int, str],
-                                  timeout: int = 10) -> List[dict]:
+    :param asn: The AS number.
+    :param path: The path to the asn.json file.
+    :return: The service or None if no service is responsible for the AS number.
+    """
+    with _services_lock:
+        lows, index = _load_services(False, path)[1]
+    i = bisect.bisect_right(lows, asn) - 1
+    if i >= 0 and index[i][1] >= asn:
+        return index[i][2]
+    return None
+
+
+def clear_asn_services_cache() -> None:
+    """Clears the in-memory cache of the services read from the asn.json file."""
+    with _services_lock:
+        _services_cache.clear()
+
+
+def asn_registration_data_lookup_(
+    asn: Union[int, str],
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> List[dict]:
     """Gets an Autonomous System Number (ASN) registration data from the RDAP service.
 
     :param asn: The AS Number to lookup.
     :param timeout: The timeout for the request.
+    :param fields: If given, only these keys(and the ones needed to follow the links)
+        of the RDAP responses are deserialized.
+    :param cache_ttl: The number of seconds the RDAP responses are cached on disk for
+        (default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
     :return: A list of dictionaries containing the RDAP information.
     """
 
@@ -181,80 +251,81 @@ def asn_registration_data_lookup_(asn: Union[int, str],
     except ValueError:
         raise ValueError('`asn` must be an integer!') from None
 
-    rdaps = []
-    for service in get_asn_services():
-        for range_ in service.ranges:
-            if asn in range_:
-                for service_url in service.addresses:
-                    try:
-                        _get_rdap(
-                            os.path.join(service_url, 'autnum/', str(asn)),
-                            rdaps,
-                            timeout=timeout
-                        )
-                    except Exception as ex:  # pylint: disable=broad-except
-                        log21.debug(
-                            f'Error getting RDAP information from {service_url}:'
-                            f' {ex.__class__.__name__}: {ex}'
-                        )
-
-    return rdaps
-
-
-def __add_info(info, key, data: Union[dict, list]):
-    """Adds information to the info dictionary.
-
-    :param info: The info dictionary.
-    :param key: The key to add the data to.
-    :param data: The data to add.
-    :return:
-    """
-    if key:
-        if key in info:
-            part = info[key]
-        else:
-            if isinstance(data, dict):
-                part = info[key] = []
-            elif isinstance(data, list):
-                part = info[key] = []
-            else:
-                raise TypeError('data must be a dict or list')
-    else:
-        part = info
-
-    if isinstance(data, dict):
-        for key_, value in data.items():
-            if key_ not in part:
-                part[key_] = value
-            else:
-                if isinstance(part[key_], list) and isinstance(value, list):
-                    __add_info(info, key_, value)
-                elif isinstance(part[key_], dict) and isinstance(value, dict):
-                    __add_info(info, key_, value)
-                else:
-                    # Throw it away
-                    pass
-    elif isinstance(data, list):
-        if isinstance(part, list):
-            part.extend(data)
-        else:
-            # Throw it away
-            pass
-
-
-def asn_registration_data_lookup(asn: Union[int, str], timeout: int = 10) -> dict:
+    service = find_service_for_asn(asn)
+    if service is None:
+        return []
+
+    urls = [f'{service_url}autnum/{asn}' for service_url in service.addresses]
+
+    return fetch_rdap(urls, timeout=timeout, fields=fields, cache_ttl=cache_ttl)
+
+
+def asn_registration_data_lookup(
+    asn: Union[int, str],
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> dict:
     """Gets an ASN's registration data from the RDAP service.
 
+    The results are cached on disk for `WHOIS21_CACHE_TTL` seconds(default: a day).
+
     :param asn: The ASN to get the registration data for.
     :param timeout: The timeout for the request.
+    :param fields: If given, only these keys of the registration data are returned
+        and only they are deserialized from the RDAP responses.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
     :return: A dictionary containing the registration data.
     """
+    if fields is not None:
+        fields = tuple(fields)
+
+    key = str(asn)
+    info = get_cached('asn', key, cache_ttl)
+    if info is not None:
+        return select_fields(info, fields)
+
     info = {}
 
-    rdaps = asn_registration_data_lookup_(asn, timeout)
+    rdaps = asn_registration_data_lookup_(asn, timeout, fields, cache_ttl)
 
     for rdap in rdaps:
         rdap.pop('links', None)
-        __add_info(info, None, rdap)
+        merge_rdap(info, rdap)
+
+    if fields is not None:
+        # Partial registration data isn't cached
+        return select_fields(info, fields)
+
+    if info:
+        set_cached('asn', key, info, cache_ttl)
 
     return info
+
+
+async def asn_registration_data_lookup_async(
+    asn: Union[int, str],
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> dict:
+    """Asynchronous version of `asn_registration_data_lookup`.
+
+    The lookup runs in the default executor of the running event loop, so the loop
+    isn't blocked while the RDAP servers are queried.
+
+    :param asn: The ASN to get the registration data for.
+    :param timeout: The timeout for the request.
+    :param fields: If given, only these keys of the registration data are returned
+        and only they are deserialized from the RDAP responses.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
+    :return: A dictionary containing the registration data.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, asn_registration_data_lookup, asn, timeout, fields, cache_ttl
+    )
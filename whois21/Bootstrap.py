@@ -0,0 +1,165 @@
+# whois21.Bootstrap.py
+
+import os
+import sys
+import time
+import functools
+import threading
+from typing import Dict, Tuple, Union, Iterable, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import log21
+
+from . import JSON
+from .HTTP import download_file
+
+__all__ = [
+    'BOOTSTRAP_URL', 'BOOTSTRAP_NAMES', 'download_bootstrap', 'download_bootstraps',
+    'get_bootstrap_dict', 'clear_bootstrap_cache'
+]
+
+# The URL of IANA's RDAP bootstrap files(asn, dns, ipv4 and ipv6)
+BOOTSTRAP_URL = 'https://data.iana.org/rdap/{name}.json'
+BOOTSTRAP_NAMES = ('asn', 'dns', 'ipv4', 'ipv6')
+# The number of seconds a parsed bootstrap file is kept in memory
+CACHE_TTL = 86400
+
+# Maps the paths of the bootstrap files to the time they were parsed, their
+# modification time and their content
+_cache: Dict[str, Tuple[float, int, dict]] = {}
+_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _default_path(name: str) -> str:
+    """Returns the default path of a bootstrap file. It is only resolved once.
+
+    :param name: The name of the file without the extension(asn, dns, ipv4 or ipv6).
+    :return: The path of the file in the whois21 package directory.
+    """
+    # pylint: disable=import-outside-toplevel
+    if sys.version_info >= (3, 9):
+        import importlib.resources as importlib_resources
+    else:
+        import importlib_resources
+    return str(importlib_resources.files('whois21') / f'{name}.json')
+
+
+def download_bootstrap(
+    name: str,
+    save_path: Optional[Union[str, os.PathLike]] = None,
+    timeout: int = 10,
+    conditional: bool = False
+) -> str:
+    """Downloads an RDAP bootstrap file from data.iana.org/rdap/.
+
+    :param name: The name of the file without the extension(asn, dns, ipv4 or ipv6).
+    :param save_path: The path to save the file to(default: site-
+        packages/whois21/<name>.json).
+    :param timeout: The timeout for the request.
+    :param conditional: If True, the file is only downloaded if it has changed on the
+        server since the last download(using its ETag and modification time).
+    :return: The path to the downloaded file.
+    """
+
+    if not save_path:
+        save_path = _default_path(name)
+
+    log21.debug(f'Downloading {name}.json file to {save_path}.')
+
+    download_file(
+        BOOTSTRAP_URL.format(name=name),
+        save_path,
+        timeout=timeout,
+        conditional=conditional
+    )
+
+    return str(save_path)
+
+
+def download_bootstraps(
+    names: Iterable[str] = BOOTSTRAP_NAMES,
+    timeout: int = 10,
+    conditional: bool = False
+) -> Dict[str, str]:
+    """Downloads several RDAP bootstrap files at the same time to their default paths.
+
+    :param names: The names of the files without the extension(default: all of
+        them).
+    :param timeout: The timeout for each request.
+    :param conditional: If True, the files are only downloaded if they have changed on
+        the server since the last download(using their ETags and modification times).
+    :return: A dictionary mapping the names of the files to their paths.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    def download(name: str) -> str:
+        return download_bootstrap(name, timeout=timeout, conditional=conditional)
+
+    # The files are on the same host, so the requests share the pooled connections
+    with ThreadPoolExecutor(max_workers=len(names),
+                            thread_name_prefix='whois21-bootstrap') as executor:
+        return dict(zip(names, executor.map(download, names)))
+
+
+def get_bootstrap_dict(
+    name: str,
+    force_download: bool = False,
+    path: Optional[Union[str, os.PathLike]] = None,
+    max_age: Optional[float] = 86400
+) -> dict:
+    """Returns a dictionary of an RDAP bootstrap file and downloads the file if it
+    doesn't exist.
+
+    :param name: The name of the file without the extension(asn, dns, ipv4 or ipv6).
+    :param force_download: If True, the file will be downloaded again.
+    :param path: The path to the file(default: site-packages/whois21/<name>.json).
+    :param max_age: The number of seconds after which the file is checked for updates.
+        The file is only downloaded again if it has changed on the server. Pass None to
+        never check for updates. (default: 86400)
+    :return: A dictionary of the file. The dictionary is cached in memory until the
+        file changes, so it must not be modified.
+    """
+
+    if not path:
+        path = _default_path(name)
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        stat = None
+
+    if force_download or stat is None or stat.st_size == 0:
+        download_bootstrap(name, path)
+        stat = os.stat(path)
+    elif max_age is not None and time.time() - stat.st_mtime > max_age:
+        # Already imported by the download
+        import requests  # pylint: disable=import-outside-toplevel
+        try:
+            download_bootstrap(name, path, conditional=True)
+            stat = os.stat(path)
+        except requests.RequestException as ex:
+            log21.debug(
+                f'Error updating {path}, using the old file: '
+                f'{ex.__class__.__name__}: {ex}'
+            )
+
+    key = str(path)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if (cached is not None and cached[1] == stat.st_mtime_ns
+            and time.monotonic() - cached[0] < CACHE_TTL):
+        return cached[2]
+
+    data = JSON.load(path)
+    with _cache_lock:
+        _cache[key] = (time.monotonic(), stat.st_mtime_ns, data)
+    return data
+
+
+def clear_bootstrap_cache() -> None:
+    """Clears the in-memory cache of the parsed bootstrap files."""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,124 @@
+# whois21.Cache.py
+
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+from typing import Any, Union, Optional
+
+import log21
+
+from . import JSON
+
+__all__ = ['get_cache_dir', 'get_cache_ttl', 'get_cached', 'set_cached', 'clear_cache']
+
+# The environment variable that sets the number of seconds the cached responses and
+# lookup data are kept for. Set it to 0 to disable the cache.
+TTL_ENV_VAR = 'WHOIS21_CACHE_TTL'
+DEFAULT_TTL = 86400
+
+
+def get_cache_dir() -> str:
+    """Returns the directory the cached responses and lookup data are saved in.
+
+    :return: `$XDG_CACHE_HOME/whois21`, `%LOCALAPPDATA%\\whois21` on Windows or
+        `~/.cache/whois21`.
+    """
+    base = os.environ.get('XDG_CACHE_HOME')
+    if not base and os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'whois21')
+
+
+def get_cache_ttl() -> int:
+    """Returns the number of seconds the cached responses and lookup data are kept
+    for.
+
+    :return: The value of the `WHOIS21_CACHE_TTL` environment variable or 86400 if it
+        is not set or is invalid. 0 means the cache is disabled.
+    """
+    try:
+        return max(int(os.environ.get(TTL_ENV_VAR, DEFAULT_TTL)), 0)
+    except ValueError:
+        return DEFAULT_TTL
+
+
+def _get_path(kind: str, key: Union[str, int]) -> str:
+    """Returns the path of the file a cached item is saved in.
+
+    :param kind: The kind of the item(e.g. "ip", "domain", "rdap", "whois" or "iana").
+    :param key: The key of the item.
+    :return: The path of the file.
+    """
+    digest = hashlib.sha256(f'{kind}:{key}'.encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(), kind, f'{digest}.json')
+
+
+def get_cached(kind: str,
+               key: Union[str, int],
+               ttl: Optional[int] = None) -> Optional[Any]:
+    """Returns a cached item if it hasn't expired.
+
+    :param kind: The kind of the item(e.g. "ip", "domain", "rdap", "whois" or "iana").
+    :param key: The key of the item.
+    :param ttl: The number of seconds the item is valid for(default: the value of
+        `get_cache_ttl()`). 0 disables the cache.
+    :return: The item or None if it is not cached, has expired or the cache is
+        disabled.
+    """
+    if ttl is None:
+        ttl = get_cache_ttl()
+    if not ttl:
+        return None
+    path = _get_path(kind, key)
+    try:
+        if time.time() - os.stat(path).st_mtime > ttl:
+            return None
+        return JSON.load(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as ex:
+        log21.debug(
+            f'Error reading {path} from the cache: {ex.__class__.__name__}: {ex}'
+        )
+        return None
+
+
+def set_cached(
+    kind: str, key: Union[str, int], value: Any, ttl: Optional[int] = None
+) -> None:
+    """Saves an item in the cache. Does nothing if the cache is disabled.
+
+    :param kind: The kind of the item(e.g. "ip", "domain", "rdap", "whois" or "iana").
+    :param key: The key of the item.
+    :param value: The JSON serializable item.
+    :param ttl: The number of seconds the item is valid for(default: the value of
+        `get_cache_ttl()`). 0 disables the cache.
+    """
+    if ttl is None:
+        ttl = get_cache_ttl()
+    if not ttl:
+        return
+    path = _get_path(kind, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Writes to a temporary file first so other processes never read a half
+        # written file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(JSON.dumps(value))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    except (OSError, TypeError, ValueError) as ex:
+        log21.debug(f'Error saving {path} to the cache: {ex.__class__.__name__}: {ex}')
+
+
+def clear_cache() -> None:
+    """Removes all the cached responses and lookup data from the disk."""
+    shutil.rmtree(get_cache_dir(), ignore_errors=True)
@@ -1,21 +1,27 @@
 # whois21.DNS.py
 
 import os
-import json
-from typing import List, Union, Optional
+import asyncio
+import threading
+from typing import Dict, List, Tuple, Union, FrozenSet, Iterable, Optional
 
-import log21
-import requests
-import importlib_resources
+from .Cache import get_cached, set_cached
+from .RDAP import fetch_rdap, merge_rdap, select_fields
+from .Bootstrap import download_bootstrap, get_bootstrap_dict
 
 __all__ = [
-    'download_dns_json', 'get_dns_dict', 'get_dns_services',
-    'domain_registration_data_lookup_', 'domain_registration_data_lookup', 'Service'
+    'download_dns_json', 'get_dns_dict', 'get_dns_services', 'find_service_for_tld',
+    'clear_dns_services_cache', 'domain_registration_data_lookup_',
+    'domain_registration_data_lookup', 'domain_registration_data_lookup_async',
+    'Service'
 ]
 
 
 def download_dns_json(
-    *, save_path: Optional[Union[str, os.PathLike]] = None, timeout: int = 10
+    *,
+    save_path: Optional[Union[str, os.PathLike]] = None,
+    timeout: int = 10,
+    conditional: bool = False
 ) -> str:
     """Downloads the dns.json file containing the RDAP bootstrap file for Domain Name
     System registrations from data.iana.org/rdap/dns.json.
@@ -23,48 +29,33 @@ def download_dns_json(
     :param save_path: The path to save the file to(default: site-
         packages/whois21/dns.json).
     :param timeout: The timeout for the request.
+    :param conditional: If True, the file is only downloaded if it has changed on the
+        server since the last download(using its ETag and modification time).
     :return: The path to the downloaded file.
     """
-
-    if not save_path:
-        save_path = str(importlib_resources.files('whois21') / 'dns.json')
-
-    if not os.path.exists(save_path):
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-
-    log21.debug(f'Downloading dns.json file to {save_path}')
-
-    with open(save_path, 'wb') as file:
-        file.write(
-            requests.get('https://data.iana.org/rdap/dns.json', timeout=timeout).content
-        )
-
-    return str(save_path)
+    return download_bootstrap(
+        'dns', save_path=save_path, timeout=timeout, conditional=conditional
+    )
 
 
 def get_dns_dict(
     *,
     force_download: bool = False,
-    path: Optional[Union[str, os.PathLike]] = None
+    path: Optional[Union[str, os.PathLike]] = None,
+    max_age: Optional[float] = 86400
 ) -> dict:
     """Returns a dictionary of the dns.json file.
 
     :param force_download: If True, the dns.json file will be downloaded again.
     :param path: The path to the dns.json file.
+    :param max_age: The number of seconds after which the dns.json file is checked for
+        updates. The file is only downloaded again if it has changed on the server.
+        Pass None to never check for updates. (default: 86400)
     :return: A dictionary of the dns.json file.
     """
-
-    if not path:
-        path = str(importlib_resources.files('whois21') / 'dns.json')
-
-    if not os.path.exists(path) or force_download:
-        download_dns_json(save_path=path)
-
-    if os.stat(path).st_size == 0:
-        download_dns_json(save_path=path)
-
-    with open(path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    return get_bootstrap_dict(
+        'dns', force_download=force_download, path=path, max_age=max_age
+    )
 
 
 class Service:
@@ -83,7 +74,11 @@ class Service:
         if len(service) != 2:
             raise ValueError('`service` must be a List containing 2 lists of string.')
         self.__domains: List[str] = service[0]
-        self.__address: str = service[1][-1]
+        self.__domains_set: FrozenSet[str] = frozenset(
+            domain.lower() for domain in service[0]
+        )
+        # The RDAP URLs end with a slash so the paths can be appended to them
+        self.__address: str = service[1][-1].rstrip('/') + '/'
 
     @property
     def domains(self) -> List[str]:
@@ -96,8 +91,39 @@ class Service:
         return self.__address
 
     def __iter__(self):
-        for item in self.__domains:
-            yield item
+        return iter(self.__domains)
+
+    def __contains__(self, tld: str) -> bool:
+        return isinstance(tld, str) and tld.lower() in self.__domains_set
+
+
+# Maps the path of a dns.json file to the parsed file, its services and a dictionary
+# mapping the TLDs(in lowercase) to their services
+_services_cache: Dict[str, Tuple[dict, List[Service], Dict[str, Service]]] = {}
+_services_lock = threading.Lock()
+
+
+def _load_services(
+    force_download: bool, path: Optional[Union[str, os.PathLike]]
+) -> Tuple[List[Service], Dict[str, Service]]:
+    """Loads the services of a dns.json file and maps the TLDs to their services. They
+    are only rebuilt when the file changes. Must be called with `_services_lock` held.
+
+    :param force_download: If True, the dns.json file will be downloaded again.
+    :param path: The path to the dns.json file.
+    :return: The services and the TLD map.
+    """
+    key = str(path)
+    dns = get_dns_dict(force_download=force_download, path=path)
+    cached = _services_cache.get(key)
+    if cached is None or cached[0] is not dns:
+        services = [Service(service) for service in dns.get('services', [])]
+        tld_map = {}
+        for service in services:
+            for tld in service.domains:
+                tld_map.setdefault(tld.lower(), service)
+        cached = _services_cache[key] = (dns, services, tld_map)
+    return cached[1], cached[2]
 
 
 def get_dns_services(
@@ -106,41 +132,42 @@ def get_dns_services(
 ) -> List[Service]:
     """Returns the list of services in the dns.json file.
 
+    The services are cached in memory until the dns.json file changes.
+
     :param force_download: If True, the dns.json file will be downloaded again.
     :param path: The path to the dns.json file.
     :return: The list of services in the dns.json file.
     """
-    dns = get_dns_dict(force_download=force_download, path=path)
-    return [Service(service) for service in dns.get('services', [])]
+    with _services_lock:
+        return _load_services(force_download, path)[0]
 
 
-def _get_rdap(url: str, rdaps: List[dict], timeout: int = 10) -> None:
-    """Gets the RDAP information from a URL.
+def find_service_for_tld(tld: str,
+                         path: Optional[Union[str, os.PathLike]
+                                        ] = None) -> Optional[Service]:
+    """Finds the service responsible for a TLD.
 
-    :param url: The URL to get the RDAP information from.
-    :param rdaps: The list to append the RDAP information to.
-    :param timeout: The timeout for the request.
+    :param tld: The TLD(e.g. "com" or "co.uk").
+    :param path: The path to the dns.json file.
+    :return: The service or None if no service is responsible for the TLD.
     """
-    if not url:
-        return
-
-    log21.debug(f'Getting domain registration data from {url}')
+    with _services_lock:
+        tld_map = _load_services(False, path)[1]
+    return tld_map.get(tld.lower())
 
-    response = requests.get(url, timeout=timeout)
-    response_json = response.json()
-    if response.status_code == 200 and response_json.get('ldhName'):
-        if response_json not in rdaps:
-            rdaps.append(response_json)
 
-            # Checks if there is another RDAP server to get the RDAP information
-            # from.
-            for link in response_json.get('links', []):
-                if link.get('rel') != 'self' and link.get('type'
-                                                          ) == 'application/rdap+json':
-                    _get_rdap(link.get('href'), rdaps, timeout=timeout)
+def clear_dns_services_cache() -> None:
+    """Clears the in-memory cache of the services read from the dns.json file."""
+    with _services_lock:
+        _services_cache.clear()
 
 
-def domain_registration_data_lookup_(domain: str, timeout: int = 10) -> List[dict]:
+def domain_registration_data_lookup_(
+    domain: str,
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> List[dict]:
     """Gets a domain's RDAP information from registry operators and/or registrars in
     real-time.
 
@@ -149,86 +176,105 @@ def domain_registration_data_lookup_(domain: str, timeout: int = 10) -> List[dic
 
     :param domain: The domain to lookup.
     :param timeout: The timeout for the request.
+    :param fields: If given, only these keys(and the ones needed to follow the links)
+        of the RDAP responses are deserialized.
+    :param cache_ttl: The number of seconds the RDAP responses are cached on disk for
+        (default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
     :return: A list of dictionaries containing the RDAP information.
     """
-    split = domain.split('.')
-    domains = ['.'.join(split[i:]) for i in range(len(split))]
-
-    rdaps = []
-
-    for service in get_dns_services():
-        if any((tld in service) for tld in domains):
-            service_url = service.address
-            try:
-                _get_rdap(
-                    os.path.join(service_url, 'domain/', domain),
-                    rdaps,
-                    timeout=timeout
-                )
-            except Exception as ex:  # pylint: disable=broad-except
-                log21.debug(
-                    f'Error getting domain registration data from {service_url}: '
-                    f'{ex.__class__.__name__}: {ex}'
-                )
-
-    return rdaps
-
-
-def __add_info(info, key, data: Union[dict, list]):
-    """Adds information to the info dictionary.
-
-    :param info: The info dictionary.
-    :param key: The key to add the information to.
-    :param data: The data to add.
-    :return:
-    """
-    if key:
-        if key in info:
-            part = info[key]
-        else:
-            if isinstance(data, dict):
-                part = info[key] = {}
-            elif isinstance(data, list):
-                part = info[key] = []
-            else:
-                raise TypeError('data must be a dict or list')
-    else:
-        part = info
-
-    if isinstance(data, dict):
-        for key_, value in data.items():
-            if key_ not in part:
-                part[key_] = value
-            else:
-                if isinstance(part[key_], list) and isinstance(value, list):
-                    __add_info(info, key_, value)
-                elif isinstance(part[key_], dict) and isinstance(value, dict):
-                    __add_info(info, key_, value)
-                else:
-                    # Throw it away
-                    pass
-    elif isinstance(data, list):
-        if isinstance(part, list):
-            part.extend(data)
-        else:
-            # Throw it away
-            pass
-
-
-def domain_registration_data_lookup(domain: str, timeout: int = 10) -> dict:
+    split = domain.lower().split('.')
+
+    with _services_lock:
+        tld_map = _load_services(False, None)[1]
+    # The service of the longest matching suffix is responsible for the domain
+    # (RFC 7484 section 4)
+    service = None
+    for i in range(len(split)):
+        service = tld_map.get('.'.join(split[i:]))
+        if service is not None:
+            break
+    if service is None:
+        return []
+
+    urls = [f'{service.address}domain/{domain}']
+
+    return fetch_rdap(
+        urls,
+        lambda response_json: bool(response_json.get('ldhName')),
+        timeout=timeout,
+        fields=fields,
+        cache_ttl=cache_ttl
+    )
+
+
+def domain_registration_data_lookup(
+    domain: str,
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> dict:
     """Gets a domain's RDAP information from registry operators and/or registrars in
     real-time.
 
+    The results are cached on disk for `WHOIS21_CACHE_TTL` seconds(default: a day).
+
     :param domain: The domain to lookup.
     :param timeout: The timeout for the request.
+    :param fields: If given, only these keys of the registration data are returned
+        and only they are deserialized from the RDAP responses.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
     :return: A dictionary containing the registration data.
     """
+    if fields is not None:
+        fields = tuple(fields)
+
+    key = domain.lower()
+    info = get_cached('domain', key, cache_ttl)
+    if info is not None:
+        return select_fields(info, fields)
+
     info = {}
 
-    rdaps = domain_registration_data_lookup_(domain, timeout)
+    rdaps = domain_registration_data_lookup_(domain, timeout, fields, cache_ttl)
 
     for rdap in rdaps:
         rdap.pop('links', None)
-        __add_info(info, None, rdap)
+        merge_rdap(info, rdap)
+
+    if fields is not None:
+        # Partial registration data isn't cached
+        return select_fields(info, fields)
+
+    if info:
+        set_cached('domain', key, info, cache_ttl)
 
     return info
+
+
+async def domain_registration_data_lookup_async(
+    domain: str,
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> dict:
+    """Asynchronous version of `domain_registration_data_lookup`.
+
+    The lookup runs in the default executor of the running event loop, so the loop
+    isn't blocked while the RDAP servers are queried.
+
+    :param domain: The domain to lookup.
+    :param timeout: The timeout for the request.
+    :param fields: If given, only these keys of the registration data are returned
+        and only they are deserialized from the RDAP responses.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
+    :return: A dictionary containing the registration data.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, domain_registration_data_lookup, domain, timeout, fields, cache_ttl
+    )
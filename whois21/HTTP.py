@@ -0,0 +1,262 @@
+# whois21.HTTP.py
+
+import os
+import time
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Dict, Union, Callable, Optional
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# requests is imported when the first request is sent, so importing whois21(e.g. for
+# `python -m whois21 --help`) doesn't load requests and urllib3
+if TYPE_CHECKING:
+    import requests
+
+__all__ = [
+    'create_session', 'SESSION', 'RDAP_HEADERS', 'HostLimiter', 'LIMITER', 'get',
+    'post', 'download_file'
+]
+
+RDAP_HEADERS = {'Accept': 'application/rdap+json, application/json'}
+# The size of the chunks downloaded files are written in
+CHUNK_SIZE = 65536
+
+
+def create_session(pool_size: int = 32, retries: int = 2) -> 'requests.Session':
+    """Creates a `requests.Session` with a pooled HTTP adapter so the connections to
+    the RDAP servers and ip-api.com can be reused between requests.
+
+    :param pool_size: The number of connections to keep alive per host.
+    :param retries: The number of times to retry a request on connection errors and
+        502/504 responses. 429/503 responses are handled by `LIMITER`.
+    :return: The session.
+    """
+    # pylint: disable=import-outside-toplevel
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=(502, 504),
+            raise_on_status=False
+        )
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_session: Optional['requests.Session'] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> 'requests.Session':
+    """Returns `SESSION` and creates it on the first call.
+
+    :return: The session.
+    """
+    global _session  # pylint: disable=global-statement
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def __getattr__(name: str):
+    # `SESSION` is created on first use
+    if name == 'SESSION':
+        return _get_session()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def _parse_retry_after(value: str) -> Optional[float]:
+    """Parses the value of a `Retry-After` header.
+
+    :param value: The number of seconds or an HTTP date.
+    :return: The number of seconds to wait or None if the value is invalid.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class HostLimiter:
+    """Keeps track of the hosts that asked us to slow down and delays the requests to
+    them until they accept requests again.
+
+    The delays come from the `Retry-After` header(sent by RDAP servers with 429 and 503
+    responses) and the `X-Rl`/`X-Ttl` headers of ip-api.com(the number of requests
+    left and the number of seconds until the limit resets).
+    """
+
+    def __init__(self, max_wait: float = 60):
+        """Initializes the HostLimiter class.
+
+        :param max_wait: The maximum number of seconds to wait for a host.
+        """
+        self.max_wait = max_wait
+        self.__blocked_until: Dict[str, float] = {}
+        self.__lock = threading.Lock()
+
+    def acquire(self, url: str) -> None:
+        """Waits until the host of `url` accepts requests.
+
+        :param url: The URL that is going to be requested.
+        """
+        host = urlsplit(url).netloc
+        with self.__lock:
+            wait = self.__blocked_until.get(host, 0) - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, self.max_wait))
+
+    def update(self, url: str, response: 'requests.Response') -> None:
+        """Reads the rate limit headers of a response.
+
+        :param url: The requested URL.
+        :param response: The response.
+        """
+        headers = response.headers
+        wait = None
+        if 'Retry-After' in headers and response.status_code in (429, 503):
+            wait = _parse_retry_after(headers['Retry-After'])
+            if wait is None:
+                wait = 1
+        elif headers.get('X-Rl') == '0':
+            wait = _parse_retry_after(headers.get('X-Ttl', ''))
+        if wait is None or wait <= 0:
+            return
+        host = urlsplit(url).netloc
+        with self.__lock:
+            self.__blocked_until[host] = max(
+                self.__blocked_until.get(host, 0),
+                time.monotonic() + min(wait, self.max_wait)
+            )
+
+
+LIMITER = HostLimiter()
+
+
+def _send(
+    send: Callable[..., 'requests.Response'], url: str, **kwargs
+) -> 'requests.Response':
+    """Sends a request while honoring the rate limits of the host. A request that gets
+    a 429(Too Many Requests) response is retried once.
+
+    :param send: `SESSION.get` or `SESSION.post`.
+    :param url: The URL.
+    :param kwargs: The arguments to pass to `send`.
+    :return: The response.
+    """
+    LIMITER.acquire(url)
+    response = send(url, **kwargs)
+    LIMITER.update(url, response)
+    if response.status_code == 429:
+        response.close()
+        LIMITER.acquire(url)
+        response = send(url, **kwargs)
+        LIMITER.update(url, response)
+    return response
+
+
+def get(url: str, **kwargs) -> 'requests.Response':
+    """Sends a GET request using `SESSION` while honoring the rate limits of the host.
+
+    :param url: The URL.
+    :param kwargs: The arguments to pass to `SESSION.get`.
+    :return: The response.
+    """
+    return _send(_get_session().get, url, **kwargs)
+
+
+def post(url: str, **kwargs) -> 'requests.Response':
+    """Sends a POST request using `SESSION` while honoring the rate limits of the host.
+
+    :param url: The URL.
+    :param kwargs: The arguments to pass to `SESSION.post`.
+    :return: The response.
+    """
+    return _send(_get_session().post, url, **kwargs)
+
+
+def download_file(
+    url: str,
+    path: Union[str, os.PathLike],
+    timeout: int = 10,
+    conditional: bool = False
+) -> bool:
+    """Downloads a file and saves it to `path`. The parent directories of `path` are
+    created if they don't exist.
+
+    The `ETag` of the response is saved next to the file(`<path>.etag`). If
+    `conditional` is True and the file already exists, the server is asked to only send
+    the file if it has changed since it was downloaded.
+
+    :param url: The URL of the file.
+    :param path: The path to save the file to.
+    :param timeout: The timeout for the request.
+    :param conditional: If True, only download the file if it has changed.
+    :return: True if the file was written, False if it hasn't changed on the server.
+    """
+    etag_path = f'{path}.etag'
+    headers = {}
+    if conditional:
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None:
+            headers['If-Modified-Since'] = formatdate(mtime, usegmt=True)
+            try:
+                with open(etag_path, 'r', encoding='utf-8') as file:
+                    headers['If-None-Match'] = file.read().strip()
+            except OSError:
+                pass
+
+    with get(url, timeout=timeout, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            # Marks the file as fresh
+            os.utime(path)
+            return False
+        response.raise_for_status()
+
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # Writes to a temporary file first so the old file stays intact if the
+        # download fails
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            # mkstemp creates the file only readable by its owner
+            os.chmod(temp_path, 0o644)
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    file.write(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    etag = response.headers.get('ETag')
+    if etag:
+        with open(etag_path, 'w', encoding='utf-8') as file:
+            file.write(etag)
+    else:
+        try:
+            os.remove(etag_path)
+        except FileNotFoundError:
+            pass
+
+    return True
@@ -1,29 +1,44 @@
 # whois21.IP.py
 
 import os
-import json
-from typing import Any, List, Union, Optional
-from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
-
-import log21
-import requests
-import importlib_resources
+import socket
+import asyncio
+import functools
+from typing import Any, Dict, List, Tuple, Union, Iterable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import (
+    IPv4Address, IPv4Network, IPv6Address, IPv6Network, ip_address, ip_network
+)
+
+from .Cache import get_cached, set_cached
+from .RDAP import fetch_rdap, merge_rdap, select_fields
+from .Bootstrap import download_bootstrap, get_bootstrap_dict
 
 __all__ = [
     'download_ipv4_json', 'get_ipv4_dict', 'download_ipv6_json', 'get_ipv6_dict',
-    'Service', 'get_ipv4_services', 'get_ipv6_services', 'ip_registration_data_lookup_',
-    'ip_registration_data_lookup', 'validate_ip'
+    'Service', 'get_ipv4_services', 'get_ipv6_services', 'find_service_for_ip',
+    'ip_registration_data_lookup_', 'ip_registration_data_lookup',
+    'ip_registration_data_lookup_async', 'bulk_ip_registration_data_lookup',
+    'validate_ip'
 ]
 
 IPNetwork = Union[IPv4Network, IPv6Network]
 
 
-def validate_ip(ip: Union[str, Any]):
+def _validate_ip(ip: Union[str, Any]) -> bool:
     """Validates an ip.
 
     :param ip: The ip to validate.
     :return: True if the ip is valid, False otherwise.
     """
+    # Fast path for the common dotted-decimal IPv4 addresses that avoids creating an
+    # IPv4Address object
+    if isinstance(ip, str) and ip.isascii():
+        parts = ip.split('.')
+        if len(parts) == 4 and all(part.isdigit() and len(part) <= 3 and
+                                   (part[0] != '0' or part == '0') and int(part) < 256
+                                   for part in parts):
+            return True
     try:
         ip_address(ip)
         return True
@@ -31,110 +46,131 @@ def validate_ip(ip: Union[str, Any]):
         return False
 
 
+_validate_ip_cached = functools.lru_cache(maxsize=65536, typed=True)(_validate_ip)
+
+
+def validate_ip(ip: Union[str, Any]) -> bool:
+    """Validates an ip. The results are cached, so validating the same ips again is
+    cheap.
+
+    :param ip: The ip to validate.
+    :return: True if the ip is valid, False otherwise.
+    """
+    try:
+        return _validate_ip_cached(ip)
+    except TypeError:
+        # Unhashable objects can't be cached
+        return _validate_ip(ip)
+
+
 def download_ipv4_json(
-    *, save_path: Optional[Union[str, os.PathLike]] = None, timeout: int = 10
+    *,
+    save_path: Optional[Union[str, os.PathLike]] = None,
+    timeout: int = 10,
+    conditional: bool = False
 ) -> str:
     """Downloads the ipv4.json file containing the RDAP servers for different ip ranges.
 
     :param save_path: The path to save the file to(default: site-
         packages/whois21/ipv4.json).
     :param timeout: The timeout for the request.
+    :param conditional: If True, the file is only downloaded if it has changed on the
+        server since the last download(using its ETag and modification time).
     :return: The path to the downloaded file.
     """
-
-    if not save_path:
-        save_path = str(importlib_resources.files('whois21') / 'ipv4.json')
-
-    if not os.path.exists(save_path):
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-
-    log21.debug(f'Downloading ipv4.json file to {save_path}.')
-
-    with open(save_path, 'wb') as file:
-        file.write(
-            requests.get('https://data.iana.org/rdap/ipv4.json',
-                         timeout=timeout).content
-        )
-
-    return str(save_path)
+    return download_bootstrap(
+        'ipv4', save_path=save_path, timeout=timeout, conditional=conditional
+    )
 
 
 def get_ipv4_dict(
     *,
     force_download: bool = False,
-    path: Optional[Union[str, os.PathLike]] = None
+    path: Optional[Union[str, os.PathLike]] = None,
+    max_age: Optional[float] = 86400
 ) -> dict:
     """Returns a dictionary of the ipv4.json file.
 
     :param force_download: If True, the ipv4.json file will be downloaded again.
     :param path: The path to the ipv4.json file.
+    :param max_age: The number of seconds after which the ipv4.json file is checked for
+        updates. The file is only downloaded again if it has changed on the server.
+        Pass None to never check for updates. (default: 86400)
     :return: A dictionary of the ipv4.json file.
     """
-
-    if not path:
-        path = str(importlib_resources.files('whois21') / 'ipv4.json')
-
-    if not os.path.exists(path) or force_download:
-        download_ipv4_json(save_path=path)
-
-    if os.stat(path).st_size == 0:
-        download_ipv4_json(save_path=path)
-
-    with open(path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    return get_bootstrap_dict(
+        'ipv4', force_download=force_download, path=path, max_age=max_age
+    )
 
 
 def download_ipv6_json(
-    *, save_path: Optional[Union[str, os.PathLike]] = None, timeout: int = 10
+    *,
+    save_path: Optional[Union[str, os.PathLike]] = None,
+    timeout: int = 10,
+    conditional: bool = False
 ) -> str:
     """Downloads the ipv6.json file containing the RDAP servers for different ip ranges.
 
     :param save_path: The path to save the file to(default: site-
         packages/whois21/ipv6.json).
     :param timeout: The timeout for the request.
+    :param conditional: If True, the file is only downloaded if it has changed on the
+        server since the last download(using its ETag and modification time).
     :return: The path to the downloaded file.
     """
-
-    if not save_path:
-        save_path = str(importlib_resources.files('whois21') / 'ipv6.json')
-
-    if not os.path.exists(save_path):
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-
-    log21.debug(f'Downloading ipv6.json file to {save_path}.')
-
-    with open(save_path, 'wb') as file:
-        file.write(
-            requests.get('https://data.iana.org/rdap/ipv6.json',
-                         timeout=timeout).content
-        )
-
-    return str(save_path)
+    return download_bootstrap(
+        'ipv6', save_path=save_path, timeout=timeout, conditional=conditional
+    )
 
 
 def get_ipv6_dict(
     *,
     force_download: bool = False,
-    path: Optional[Union[str, os.PathLike]] = None
+    path: Optional[Union[str, os.PathLike]] = None,
+    max_age: Optional[float] = 86400
 ) -> dict:
     """Returns a dictionary of the ipv6.json file.
 
     :param force_download: If True, the ipv6.json file will be downloaded again.
     :param path: The path to the ipv6.json file.
+    :param max_age: The number of seconds after which the ipv6.json file is checked for
+        updates. The file is only downloaded again if it has changed on the server.
+        Pass None to never check for updates. (default: 86400)
     :return: A dictionary of the ipv6.json file.
     """
+    return get_bootstrap_dict(
+        'ipv6', force_download=force_download, path=path, max_age=max_age
+    )
 
-    if not path:
-        path = str(importlib_resources.files('whois21') / 'ipv6.json')
 
-    if not os.path.exists(path) or force_download:
-        download_ipv6_json(save_path=path)
+def _parse_network(range_: str) -> Tuple[int, int, int]:
+    """Parses a network in CIDR notation without creating an `ipaddress` object, which
+    is several times slower.
 
-    if os.stat(path).st_size == 0:
-        download_ipv6_json(save_path=path)
-
-    with open(path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    :param range_: The network(e.g. "41.0.0.0/8" or "2c00::/12").
+    :return: The version, the first address and the last address of the network with
+        the addresses as integers.
+    """
+    host, _, prefix = range_.partition('/')
+    if ':' in host:
+        version, family, max_prefixlen = 6, socket.AF_INET6, 128
+    else:
+        version, family, max_prefixlen = 4, socket.AF_INET, 32
+    try:
+        value = int.from_bytes(socket.inet_pton(family, host), 'big')
+        prefixlen = int(prefix) if prefix else max_prefixlen
+    except (OSError, ValueError):
+        # Lets `ipaddress` raise a descriptive error
+        network = ip_network(range_)
+        return (
+            network.version, int(network.network_address),
+            int(network.broadcast_address)
+        )
+    if not 0 <= prefixlen <= max_prefixlen:
+        raise ValueError(f'{range_!r} does not appear to be an IPv{version} network')
+    host_bits = (1 << (max_prefixlen - prefixlen)) - 1
+    first = value & ~host_bits
+    return version, first, first | host_bits
 
 
 class Service:
@@ -153,26 +189,88 @@ class Service:
             raise TypeError('`service` must be a List.')
         if len(service) != 2:
             raise ValueError('`service` must be a List containing 2 lists of string.')
-        self.__networks: List[IPNetwork] = [ip_network(range_) for range_ in service[0]]
-        self.__addresses: List[str] = service[1]
+        self.__ranges: List[str] = service[0]
+        # The `ipaddress` network objects are only created when they are used
+        self.__networks: Optional[List[IPNetwork]] = None
+        # (version, first address, last address) of the networks as integers, so
+        # checking whether an address is in them doesn't need `ipaddress` objects
+        self.__bounds: List[Tuple[int, int, int]
+                            ] = [_parse_network(range_) for range_ in self.__ranges]
+        # The RDAP URLs end with a slash so the paths can be appended to them
+        self.__addresses: List[str] = [
+            address.rstrip('/') + '/' for address in service[1]
+        ]
 
     @property
     def networks(self) -> List[IPNetwork]:
         """Returns a list of ranges."""
+        if self.__networks is None:
+            self.__networks = [ip_network(range_) for range_ in self.__ranges]
         return self.__networks
 
+    @property
+    def bounds(self) -> List[Tuple[int, int, int]]:
+        """Returns a list of (version, first address, last address) tuples of the
+        networks with the addresses as integers."""
+        return self.__bounds
+
     @property
     def addresses(self) -> List[str]:
         """Returns a list of addresses."""
         return self.__addresses
 
-    def __iter__(self):
-        for network in self.__networks:
-            for item in network:
-                yield item
+    def __contains__(self, address: Union[str, IPv4Address, IPv6Address]) -> bool:
+        if not isinstance(address, (IPv4Address, IPv6Address)):
+            address = ip_address(address)
+        version, value = address.version, int(address)
+        return any(
+            version == version_ and first <= value <= last
+            for version_, first, last in self.__bounds
+        )
 
     def __repr__(self):
-        return f'Service(ranges={self.__networks}, addresses={self.__addresses})'
+        return f'Service(ranges={self.networks}, addresses={self.__addresses})'
+
+
+# The number of leading bits of the addresses the networks are indexed by(the first
+# octet of IPv4 addresses and the first hextet of IPv6 addresses)
+_INDEX_BITS = {'ipv4': 8, 'ipv6': 16}
+
+# Maps the name and path of the ipv4.json and ipv6.json files to the parsed files,
+# their services and an index mapping the leading bits of the addresses to the
+# (first address, last address, service) tuples of the networks that contain them,
+# the longest prefixes first
+_Index = Dict[int, List[Tuple[int, int, Service]]]
+_services_cache: Dict[Tuple[str, str], Tuple[dict, List[Service], _Index]] = {}
+
+
+def _load_services(
+    name: str, force_download: bool, path: Optional[Union[str, os.PathLike]]
+) -> Tuple[List[Service], _Index]:
+    """Returns the services of the ipv4.json or ipv6.json file and the index used to
+    find the service of an address. They are only rebuilt when the file changes.
+
+    :param name: "ipv4" or "ipv6".
+    :param force_download: If True, the file will be downloaded again.
+    :param path: The path to the file.
+    :return: The services and the index.
+    """
+    key = (name, str(path))
+    data = get_bootstrap_dict(name, force_download=force_download, path=path)
+    cached = _services_cache.get(key)
+    if cached is None or cached[0] is not data:
+        services = [Service(service) for service in data.get('services', [])]
+        index: _Index = {}
+        shift = (32 if name == 'ipv4' else 128) - _INDEX_BITS[name]
+        for service in services:
+            for _, first, last in service.bounds:
+                for bucket in range(first >> shift, (last >> shift) + 1):
+                    index.setdefault(bucket, []).append((first, last, service))
+        for candidates in index.values():
+            # The smallest network is the one with the longest prefix
+            candidates.sort(key=lambda item: item[1] - item[0])
+        cached = _services_cache[key] = (data, services, index)
+    return cached[1], cached[2]
 
 
 def get_ipv4_services(
@@ -181,12 +279,13 @@ def get_ipv4_services(
 ) -> List[Service]:
     """Returns the list of services present in the ipv4.json file.
 
+    The services are cached in memory until the ipv4.json file changes.
+
     :param force_download: If True, the ipv4.json file will be downloaded again.
     :param path: The path to the ipv4.json file.
     :return: The list of services in the ipv4.json file.
     """
-    asn = get_ipv4_dict(force_download=force_download, path=path)
-    return [Service(service) for service in asn.get('services', [])]
+    return _load_services('ipv4', force_download, path)[0]
 
 
 def get_ipv6_services(
@@ -195,135 +294,186 @@ def get_ipv6_services(
 ) -> List[Service]:
     """Returns the list of services present in the ipv6.json file.
 
+    The services are cached in memory until the ipv6.json file changes.
+
     :param force_download: If True, the ipv6.json file will be downloaded again.
     :param path: The path to the ipv6.json file.
     :return: The list of services in the ipv6.json file.
     """
-    asn = get_ipv6_dict(force_download=force_download, path=path)
-    return [Service(service) for service in asn.get('services', [])]
-
-
-def _get_rdap(url: str, rdaps: List[dict], timeout: int = 10) -> None:
-    """Gets the RDAP information from a link.
-
-    :param url: The url to get the RDAP information from.
-    :param rdaps: The list to append the RDAP information to.
-    :param timeout: The timeout for the request.
-    :return:
-    """
-    if not url:
-        return
+    return _load_services('ipv6', force_download, path)[0]
 
-    log21.debug(f'Getting domain registration data from {url}.')
 
-    response = requests.get(url, timeout=timeout)
-    response_json = response.json()
-    if response.status_code == 200 and (not response_json.get('errorCode')
-                                        and not response_json.get('error')):
-        if response_json not in rdaps:
-            rdaps.append(response_json)
-
-            # Checks if there is another RDAP link that might have more information.
-            for link in response_json.get('links', []):
-                if link.get('rel') != 'self' and link.get('type'
-                                                          ) == 'application/rdap+json':
-                    _get_rdap(link.get('href'), rdaps, timeout=timeout)
+def find_service_for_ip(
+    ip: Union[str, Any],
+    path: Optional[Union[str, os.PathLike]] = None
+) -> Optional[Service]:
+    """Finds the service responsible for an ip address.
 
+    Only the networks that share the first octet(IPv4) or hextet(IPv6) with the
+    address are checked, and the one with the longest prefix is used.
 
-def ip_registration_data_lookup_(ip: str, timeout: int = 10) -> List[dict]:
+    :param ip: The ip address(a string, an integer or an `ipaddress` address object).
+    :param path: The path to the ipv4.json or ipv6.json bootstrap file(depending on
+        the version of the address).
+    :return: The service or None if no service is responsible for the address.
+    """
+    if isinstance(ip, (IPv4Address, IPv6Address)):
+        address = ip
+    else:
+        address = ip_address(ip)
+    name = f'ipv{address.version}'
+    index = _load_services(name, False, path)[1]
+    value = int(address)
+    shift = address.max_prefixlen - _INDEX_BITS[name]
+    for first, last, service in index.get(value >> shift, ()):
+        if first <= value <= last:
+            return service
+    return None
+
+
+def ip_registration_data_lookup_(
+    ip: str,
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> List[dict]:
     """Gets an IP address's RDAP information from registry operators and/or registrars
     in real-time.
 
     :param ip: The ip to lookup.
     :param timeout: The timeout for the request.
+    :param fields: If given, only these keys(and the ones needed to follow the links)
+        of the RDAP responses are deserialized.
+    :param cache_ttl: The number of seconds the RDAP responses are cached on disk for
+        (default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
     :return: A list of dictionaries containing the RDAP information.
     """
+    # The address is only parsed once and its normalized form is used in the URLs
     try:
         address = ip_address(ip)
     except ValueError:
         raise ValueError('`ip` must be a valid ip address.') from None
+    service = find_service_for_ip(address)
+    if service is None:
+        return []
 
-    rdaps = []
+    urls = [f'{service_url}ip/{address}' for service_url in service.addresses]
 
-    if address.version == 4:
-        services = get_ipv4_services()
-    else:
-        services = get_ipv6_services()
-
-    for service in services:
-        for network in service.networks:
-            if address in network:
-                for service_url in service.addresses:
-                    try:
-                        _get_rdap(
-                            os.path.join(service_url, 'ip/', ip),
-                            rdaps,
-                            timeout=timeout
-                        )
-                    except Exception as ex:  # pylint: disable=broad-except
-                        log21.debug(
-                            f'Error getting RDAP information from {service_url}:'
-                            f' {ex.__class__.__name__}: {ex}'
-                        )
-
-    return rdaps
-
-
-def __add_info(info, key, data: Union[dict, list]):
-    """Adds information to the info dictionary.
-
-    :param info: The info dictionary.
-    :param key: The key to add the data to.
-    :param data: The data to add.
-    :return:
-    """
-    if key:
-        if key in info:
-            part = info[key]
-        else:
-            if isinstance(data, dict):
-                part = info[key] = []
-            elif isinstance(data, list):
-                part = info[key] = []
-            else:
-                raise TypeError('data must be a dict or list')
-    else:
-        part = info
-
-    if isinstance(data, dict):
-        for key_, value in data.items():
-            if key_ not in part:
-                part[key_] = value
-            else:
-                if isinstance(part[key_], list) and isinstance(value, list):
-                    __add_info(info, key_, value)
-                elif isinstance(part[key_], dict) and isinstance(value, dict):
-                    __add_info(info, key_, value)
-                else:
-                    # Throw it away
-                    pass
-    elif isinstance(data, list):
-        if isinstance(part, list):
-            part.extend(data)
-        else:
-            # Throw it away
-            pass
-
-
-def ip_registration_data_lookup(ip: Union[str, Any], timeout: int = 10) -> dict:
+    return fetch_rdap(urls, timeout=timeout, fields=fields, cache_ttl=cache_ttl)
+
+
+def ip_registration_data_lookup(
+    ip: Union[str, Any],
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> dict:
     """Gets an IP address's RDAP information from registry operators and/or registrars
     in real-time.
 
+    The results are cached on disk for `WHOIS21_CACHE_TTL` seconds(default: a day).
+
     :param ip: The ip to lookup.
     :param timeout: The timeout for the request.
+    :param fields: If given, only these keys of the registration data are returned
+        and only they are deserialized from the RDAP responses.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
     :return: A dictionary containing the registration data.
     """
+    if fields is not None:
+        fields = tuple(fields)
+
+    key = str(ip)
+    info = get_cached('ip', key, cache_ttl)
+    if info is not None:
+        return select_fields(info, fields)
+
     info = {}
 
-    rdaps = ip_registration_data_lookup_(ip, timeout)
+    rdaps = ip_registration_data_lookup_(ip, timeout, fields, cache_ttl)
 
     for rdap in rdaps:
         rdap.pop('links', None)
-        __add_info(info, None, rdap)
+        merge_rdap(info, rdap)
+
+    if fields is not None:
+        # Partial registration data isn't cached
+        return select_fields(info, fields)
+
+    if info:
+        set_cached('ip', key, info, cache_ttl)
 
     return info
+
+
+async def ip_registration_data_lookup_async(
+    ip: Union[str, Any],
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> dict:
+    """Asynchronous version of `ip_registration_data_lookup`.
+
+    The lookup runs in the default executor of the running event loop, so the loop
+    isn't blocked while the RDAP servers are queried.
+
+    :param ip: The ip to lookup.
+    :param timeout: The timeout for the request.
+    :param fields: If given, only these keys of the registration data are returned
+        and only they are deserialized from the RDAP responses.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
+    :return: A dictionary containing the registration data.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, ip_registration_data_lookup, ip, timeout, fields, cache_ttl
+    )
+
+
+def bulk_ip_registration_data_lookup(
+    ips: Iterable[Union[str, Any]],
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None,
+    max_workers: int = 16
+) -> Dict[str, dict]:
+    """Gets the registration data of multiple IP addresses concurrently.
+
+    The bootstrap files are only parsed once, the requests share the pooled HTTP
+    session and at most `RDAP.MAX_REQUESTS_PER_HOST` requests are sent to each RDAP
+    server at the same time.
+
+    :param ips: The ips to lookup.
+    :param timeout: The timeout for each request.
+    :param fields: If given, only these keys of the registration data are returned
+        and only they are deserialized from the RDAP responses.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
+    :param max_workers: The maximum number of ips looked up at the same time.
+    :return: A dictionary mapping each ip to its registration data.
+    """
+    if fields is not None:
+        fields = tuple(fields)
+
+    addresses = []
+    for i, ip in enumerate(ips):
+        if not validate_ip(ip):
+            raise ValueError(f'Invalid ip[{i}]: {ip}')
+        addresses.append(str(ip))
+    addresses = list(dict.fromkeys(addresses))
+    if not addresses:
+        return {}
+
+    def lookup(ip: str) -> dict:
+        return ip_registration_data_lookup(ip, timeout, fields, cache_ttl)
+
+    # The lookups wait for the requests they send to the shared RDAP thread pool, so
+    # they can't run in that pool themselves
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(addresses))) as executor:
+        return dict(zip(addresses, executor.map(lookup, addresses)))
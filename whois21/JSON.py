@@ -0,0 +1,133 @@
+# whois21.JSON.py
+
+import os
+import json
+import threading
+from typing import Any, Union, BinaryIO, Collection
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# Each thread reuses its own `simdjson.Parser` so its buffers are only allocated once
+_local = threading.local()
+
+__all__ = ['loads', 'loads_fields', 'load', 'dumps', 'dump']
+
+
+def _simdjson_parse(data: Union[bytes, str]) -> Any:
+    """Parses JSON data using the `simdjson.Parser` of the current thread.
+
+    The returned document is only valid until the parser is used again.
+
+    :param data: The JSON data.
+    :return: The lazily accessed document.
+    """
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = _local.parser = simdjson.Parser()
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return parser.parse(data)
+
+
+def _simdjson_materialize(value: Any) -> Any:
+    """Converts a value of a simdjson document to Python objects.
+
+    :param value: The value.
+    :return: The Python object.
+    """
+    if isinstance(value, simdjson.Object):
+        return value.as_dict()
+    if isinstance(value, simdjson.Array):
+        return value.as_list()
+    return value
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Deserializes JSON data using `orjson` or `simdjson` if one of them is installed,
+    otherwise using the `json` module.
+
+    :param data: The JSON data.
+    :return: The deserialized object.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if simdjson is not None:
+        return _simdjson_materialize(_simdjson_parse(data))
+    return json.loads(data)
+
+
+def loads_fields(data: Union[bytes, str], fields: Collection[str]) -> Any:
+    """Deserializes only some keys of a JSON object. With `simdjson` the values of the
+    other keys are never converted to Python objects.
+
+    :param data: The JSON data.
+    :param fields: The keys to keep.
+    :return: A dictionary containing the keys present in the object, or the
+        deserialized data if it isn't an object.
+    """
+    if simdjson is not None:
+        document = _simdjson_parse(data)
+        if isinstance(document, simdjson.Object):
+            return {
+                key: _simdjson_materialize(document[key])
+                for key in fields if key in document
+            }
+        return _simdjson_materialize(document)
+
+    obj = loads(data)
+    if isinstance(obj, dict):
+        return {key: obj[key] for key in fields if key in obj}
+    return obj
+
+
+def load(path: Union[str, os.PathLike]) -> Any:
+    """Reads and deserializes a JSON file.
+
+    :param path: The path to the JSON file.
+    :return: The deserialized object.
+    """
+    with open(path, 'rb') as file:
+        return loads(file.read())
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serializes an object to JSON using `orjson` if it is installed, otherwise using
+    the `json` module.
+
+    :param obj: The object to serialize.
+    :param indent: If True, the JSON data is indented with 2 spaces.
+    :return: The UTF-8 encoded JSON data.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dump(obj: Any, file: BinaryIO, indent: bool = False) -> None:
+    """Serializes an object to JSON and writes it to a binary file. Without `orjson`,
+    the data is written in chunks as it is encoded instead of building the whole
+    document in memory first.
+
+    :param obj: The object to serialize.
+    :param file: The file opened for writing in binary mode.
+    :param indent: If True, the JSON data is indented with 2 spaces.
+    """
+    if orjson is not None:
+        file.write(dumps(obj, indent))
+        return
+    if indent:
+        encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+    else:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for chunk in encoder.iterencode(obj):
+        file.write(chunk.encode('utf-8'))
@@ -0,0 +1,560 @@
+# whois21.Query.py
+
+import time
+import socket
+import asyncio
+import selectors
+import threading
+from typing import Set, Dict, List, Tuple, Union, Optional
+
+import log21
+from log21.Colors import RED, RESET, LIGHT_RED as LRED, LIGHT_BLUE as LBLUE
+
+__all__ = ['ServerThrottle', 'query_whois_server', 'query_whois_server_async']
+
+# The number of seconds a WHOIS server can stay silent after it started sending its
+# response before the response is considered complete
+IDLE_TIMEOUT = 2.0
+# The maximum number of seconds to wait for a connection to a WHOIS server. Servers
+# that are up accept connections quickly, so dead servers are given up on early
+CONNECT_TIMEOUT = 3.0
+# The number of seconds the addresses of the WHOIS servers are cached for and the
+# number of seconds the servers that can't be resolved are remembered for
+RESOLVE_TTL = 3600
+RESOLVE_FAILURE_TTL = 60
+# The number of bytes received from WHOIS servers at once. Most responses fit in one
+# read
+RECV_BUFFER_SIZE = 65536
+
+# The error message and exception(if any) of a failed WHOIS query
+_Error = Tuple[str, Optional[Exception]]
+
+
+def _debug_enabled() -> bool:
+    """Checks if the debug messages are logged, so the messages logged for every query
+    are only formatted when they are.
+
+    :return: True if the debug messages are logged, False otherwise.
+    """
+    return log21.root.isEnabledFor(log21.DEBUG)
+
+
+class ServerThrottle:
+    """Spaces out the queries sent to each WHOIS server.
+
+    WHOIS servers block the clients that send them too many queries, so each server
+    is sent at most `qps` queries per second. The queries get their time slots in the
+    order they ask for them.
+    """
+
+    def __init__(self, qps: float = 1.0):
+        """Initializes the ServerThrottle class.
+
+        :param qps: The maximum number of queries sent to each server per second.
+        """
+        if qps <= 0:
+            raise ValueError('`qps` must be a positive number.')
+        self.interval = 1 / qps
+        self.__next_slot: Dict[str, float] = {}
+        self.__lock = threading.Lock()
+
+    def __reserve(self, server: str) -> float:
+        """Reserves the next time slot of the server.
+
+        :param server: The WHOIS server that is going to be queried.
+        :return: The number of seconds to wait before sending the query.
+        """
+        server = server.lower()
+        with self.__lock:
+            now = time.monotonic()
+            slot = max(now, self.__next_slot.get(server, 0))
+            self.__next_slot[server] = slot + self.interval
+        return slot - now
+
+    def acquire(self, server: str, stop: Optional[threading.Event] = None) -> None:
+        """Waits until a query can be sent to the server.
+
+        :param server: The WHOIS server that is going to be queried.
+        :param stop: If given, the wait ends early when the event is set.
+        """
+        delay = self.__reserve(server)
+        if delay > 0:
+            if stop is not None:
+                stop.wait(delay)
+            else:
+                time.sleep(delay)
+
+    async def acquire_async(self, server: str) -> None:
+        """Asynchronous version of `acquire`.
+
+        :param server: The WHOIS server that is going to be queried.
+        """
+        delay = self.__reserve(server)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class _QuerySkipped(Exception):
+    """The exception of the errors of the queries that were stopped because another
+    server responded or skipped because their server has the same address as another
+    server. They aren't counted as failures of the servers."""
+
+
+class _QueryGroup:
+    """The queries sent to the WHOIS servers of a domain.
+
+    The servers with the same address as a server that was already queried are
+    skipped, since they would send the same responses. Once a server responds with
+    valid data, the queries to the other servers are stopped: their sockets are shut
+    down, so the threads waiting for them return right away instead of blocking until
+    the timeout(the interpreter waits for the threads of the executors before
+    exiting). The sockets are only closed by the threads that use them.
+    """
+
+    def __init__(self):
+        """Initializes the _QueryGroup class."""
+        self.stop_event = threading.Event()
+        self.__sockets: Set[socket.socket] = set()
+        self.__addresses: Set[tuple] = set()
+        self.__lock = threading.Lock()
+
+    @property
+    def stopped(self) -> bool:
+        """Whether the queries were stopped."""
+        return self.stop_event.is_set()
+
+    def claim(self, server: str, addresses: List[Tuple[int, tuple]]) -> None:
+        """Claims the addresses of a server for its query.
+
+        :param server: The WHOIS server.
+        :param addresses: The addresses of the server(see `_resolve`).
+        :raises _QuerySkipped: If one of the addresses was claimed by another server.
+        """
+        addresses_ = {address for _, address in addresses}
+        with self.__lock:
+            if addresses_ & self.__addresses:
+                raise _QuerySkipped(
+                    f'Skipped "{server}": same address as another server.'
+                )
+            self.__addresses.update(addresses_)
+
+    def add(self, sock: socket.socket) -> bool:
+        """Registers the socket of a query, so it is shut down when the queries are
+        stopped.
+
+        :param sock: The socket.
+        :return: False if the queries were already stopped, True otherwise.
+        """
+        with self.__lock:
+            if self.stop_event.is_set():
+                return False
+            self.__sockets.add(sock)
+            return True
+
+    def discard(self, sock: socket.socket) -> None:
+        """Unregisters the socket of a query that has finished.
+
+        :param sock: The socket.
+        """
+        with self.__lock:
+            self.__sockets.discard(sock)
+
+    def stop(self) -> None:
+        """Stops the queries that are still running."""
+        with self.__lock:
+            self.stop_event.set()
+            sockets = list(self.__sockets)
+            self.__sockets.clear()
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def _is_skipped(error: Optional[_Error]) -> bool:
+    """Checks if a query was stopped or skipped(see `_QuerySkipped`).
+
+    :param error: The error of the query.
+    :return: True if the query was stopped or skipped, False otherwise.
+    """
+    return error is not None and isinstance(error[1], _QuerySkipped)
+
+
+def _stopped_error(server: str) -> _Error:
+    """Returns the error of a query that was stopped.
+
+    :param server: The WHOIS server of the query.
+    :return: The error.
+    """
+    log21.debug(f'Stopped the query to {LBLUE}{server}{RESET}.')
+    return f'The query to "{server}" was stopped.', _QuerySkipped(server)
+
+
+def _skipped_error(server: str, ex: _QuerySkipped) -> _Error:
+    """Returns the error of a query that was skipped.
+
+    :param server: The WHOIS server of the query.
+    :param ex: The exception raised by `_QueryGroup.claim`.
+    :return: The error.
+    """
+    log21.debug(f'Skipping {LBLUE}{server}{RESET}: same address as another server.')
+    return str(ex), ex
+
+
+def _socket_error(action: str, server: str, ex: Exception) -> _Error:
+    """Returns the error of a query that failed.
+
+    :param action: What was being done when the error happened(e.g. "connecting to").
+    :param server: The WHOIS server of the query.
+    :param ex: The exception.
+    :return: The error.
+    """
+    log21.debug(
+        f'Error {action} "{RED}{server}{RESET}": '
+        f'{LRED}{ex.__class__.__name__}: {ex}{RESET}'
+    )
+    return f'Error {action} "{server}": {ex.__class__.__name__}: {ex}', ex
+
+
+# Maps the host names of the WHOIS servers to the time their addresses expire and
+# their (address family, socket address) tuples or the arguments of the error raised
+# while resolving them
+_Address = Tuple[int, tuple]
+_resolved: Dict[str, Tuple[float, Union[List[_Address], tuple]]] = {}
+_resolved_lock = threading.Lock()
+
+
+def _resolve(host: str) -> List[_Address]:
+    """Resolves the addresses of a WHOIS server.
+
+    The addresses are cached for `RESOLVE_TTL` seconds and the failures for
+    `RESOLVE_FAILURE_TTL` seconds, so the servers that don't exist aren't resolved
+    again by every lookup. IPv4 addresses come first because many networks resolve
+    IPv6 addresses they can't connect to, which stalls the connection until the
+    timeout.
+
+    :param host: The host name of the WHOIS server.
+    :return: The (address family, socket address) tuples of the server.
+    :raises socket.gaierror: If the host name can't be resolved.
+    """
+    now = time.monotonic()
+    with _resolved_lock:
+        cached = _resolved.get(host)
+    if cached is not None and cached[0] > now:
+        if isinstance(cached[1], list):
+            return cached[1]
+        raise socket.gaierror(*cached[1])
+
+    try:
+        infos = socket.getaddrinfo(host, 43, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    except socket.gaierror as ex:
+        with _resolved_lock:
+            _resolved[host] = (now + RESOLVE_FAILURE_TTL, ex.args)
+        raise
+    addresses = list(
+        dict.fromkeys(
+            (family, address) for family, _, _, _, address in
+            sorted(infos, key=lambda info: info[0] != socket.AF_INET)
+        )
+    )
+    with _resolved_lock:
+        _resolved[host] = (now + RESOLVE_TTL, addresses)
+    return addresses
+
+
+class _Response:
+    """The response of a WHOIS server that is being received.
+
+    The synchronous and asynchronous queries only wait for the data; this class
+    decides how long they wait and when the response is complete. The data is
+    received straight into one buffer that grows when it is full.
+    """
+
+    def __init__(self, server: str, timeout: float):
+        """Initializes the _Response class.
+
+        :param server: The WHOIS server.
+        :param timeout: The timeout for receiving the whole response.
+        """
+        self.server = server
+        self.__buffer = bytearray(RECV_BUFFER_SIZE)
+        self.__size = 0
+        self.__deadline = time.monotonic() + timeout
+
+    @property
+    def raw(self) -> bytes:
+        """The data received so far."""
+        with memoryview(self.__buffer) as view:
+            return bytes(view[:self.__size])
+
+    def wait_time(self) -> float:
+        """Returns the number of seconds to wait for more data. Some servers keep the
+        connection open after sending the response, so the response is considered
+        complete once the server stops sending data for `IDLE_TIMEOUT` seconds.
+
+        :return: The number of seconds.
+        :raises socket.timeout: If the timeout has passed.
+        """
+        remaining = self.__deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout('timed out')
+        return min(remaining, IDLE_TIMEOUT) if self.__size else remaining
+
+    def idle(self) -> bool:
+        """Handles the server not sending data within `wait_time` seconds.
+
+        :return: True if the response is complete, False if the data has to be waited
+            for again.
+        """
+        if self.__size:
+            log21.debug(f'{LBLUE}{self.server}{RESET} stopped sending data.')
+            return True
+        return False
+
+    def recv_into(self, sock: socket.socket) -> bool:
+        """Receives data from a socket that is ready to be read.
+
+        :param sock: The socket.
+        :return: False if the server closed the connection, True otherwise.
+        """
+        if self.__size == len(self.__buffer):
+            self.__buffer.extend(bytes(len(self.__buffer)))
+        with memoryview(self.__buffer) as view:
+            received = sock.recv_into(view[self.__size:])
+        self.__size += received
+        return received > 0
+
+    def feed(self, data: bytes) -> bool:
+        """Adds the data received by an asynchronous query.
+
+        :param data: The data.
+        :return: False if the server closed the connection(`data` is empty), True
+            otherwise.
+        """
+        end = self.__size + len(data)
+        self.__buffer[self.__size:end] = data
+        self.__size = end
+        return bool(data)
+
+    def result(self) -> Tuple[bytes, Optional[_Error]]:
+        """Returns the complete response.
+
+        :return: The raw response and None, or an empty response and its error.
+        """
+        raw = self.raw
+        # Checks if we received any data from the whois server.
+        if not raw:
+            log21.debug(f'No data received from {RED}{self.server}{RESET}.')
+            return raw, (f'No data received from {self.server}.', None)
+        return raw, None
+
+
+def _connect(
+    server: str, timeout: float, group: Optional[_QueryGroup] = None
+) -> socket.socket:
+    """Connects to a WHOIS server. The addresses of the server are tried in order
+    until one of them accepts the connection.
+
+    :param server: The WHOIS server.
+    :param timeout: The timeout of the socket. Each address has to accept the
+        connection within `CONNECT_TIMEOUT` seconds if that is shorter.
+    :param group: If given, the addresses of the server are claimed in the group and
+        the socket is registered in it(so the connection is aborted when the queries
+        of the group are stopped).
+    :return: The connected socket.
+    :raises socket.error: If the server can't be resolved or none of its addresses
+        accepted the connection(the error of the last address).
+    :raises _QuerySkipped: If another server of the group has the same address.
+    """
+    addresses = _resolve(server)
+    if group is not None:
+        group.claim(server, addresses)
+    error: OSError = socket.gaierror(f'No addresses found for {server}.')
+    for family, address in addresses:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        # The query is sent right away instead of waiting for more data to send with
+        # it(asyncio sets this option on the sockets of its streams)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if group is not None and not group.add(sock):
+            sock.close()
+            raise ConnectionAbortedError('The query was stopped.')
+        try:
+            sock.settimeout(min(timeout, CONNECT_TIMEOUT))
+            sock.connect(address)
+            sock.settimeout(timeout)
+            return sock
+        except socket.error as ex:
+            error = ex
+            if group is not None:
+                group.discard(sock)
+            sock.close()
+            if group is not None and group.stopped:
+                break
+    raise error
+
+
+async def _connect_async(server: str, timeout: float) -> socket.socket:
+    """Asynchronous version of `_connect`.
+
+    :param server: The WHOIS server.
+    :param timeout: The timeout for the query. Each address has to accept the
+        connection within `CONNECT_TIMEOUT` seconds if that is shorter.
+    :return: The connected non-blocking socket.
+    :raises socket.error: If none of the addresses accepted the connection(the error
+        of the last address).
+    """
+    loop = asyncio.get_running_loop()
+    addresses = await loop.run_in_executor(None, _resolve, server)
+    error: OSError = socket.gaierror(f'No addresses found for {server}.')
+    for family, address in addresses:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(
+                loop.sock_connect(sock, address), min(timeout, CONNECT_TIMEOUT)
+            )
+            return sock
+        except asyncio.TimeoutError:
+            # Reported the same way as the timeouts of the sockets
+            error = socket.timeout('timed out')
+        except socket.error as ex:
+            error = ex
+        sock.close()
+    raise error
+
+
+def query_whois_server(
+    server: str,
+    query: bytes,
+    timeout: float,
+    throttle: Optional[ServerThrottle] = None,
+    group: Optional[_QueryGroup] = None
+) -> Tuple[bytes, Optional[_Error]]:
+    """Sends a query to a WHOIS server and receives the response.
+
+    :param server: The WHOIS server to query.
+    :param query: The encoded query(ending with CRLF).
+    :param timeout: The timeout for receiving the whole response. The connection has
+        to be made within `CONNECT_TIMEOUT` seconds if that is shorter.
+    :param throttle: If given, the query waits for its turn to be sent to the server.
+    :param group: If given, the query stops when the queries of the group are stopped.
+    :return: The raw response and None, or the data received so far and the error.
+    """
+    if throttle is not None:
+        throttle.acquire(server, group.stop_event if group is not None else None)
+    if group is not None and group.stopped:
+        return b'', _stopped_error(server)
+    # Create a socket connection to the whois server.
+    debug = _debug_enabled()
+    if debug:
+        log21.debug(f'Connecting to {LBLUE}{server}{RESET}...')
+    try:
+        sock = _connect(server, timeout, group)
+    except _QuerySkipped as ex:
+        return b'', _skipped_error(server, ex)
+    except socket.error as ex:
+        if group is not None and group.stopped:
+            return b'', _stopped_error(server)
+        return b'', _socket_error('connecting to', server, ex)
+
+    with sock:
+        try:
+            # Send the query to the whois server.
+            if debug:
+                log21.debug(f'Sending query to {LBLUE}{server}{RESET}...')
+            try:
+                sock.sendall(query)
+            except socket.error as ex:
+                return b'', _socket_error('sending query to', server, ex)
+            # Receive the raw whois data from the whois server.
+            if debug:
+                log21.debug(f'Receiving data from {LBLUE}{server}{RESET}...')
+            response = _Response(server, timeout)
+            try:
+                with selectors.DefaultSelector() as selector:
+                    selector.register(sock, selectors.EVENT_READ)
+                    while group is None or not group.stopped:
+                        if selector.select(response.wait_time()):
+                            if not response.recv_into(sock):
+                                break
+                        elif response.idle():
+                            break
+            except socket.error as ex:
+                return response.raw, _socket_error('receiving data from', server, ex)
+        finally:
+            if group is not None:
+                group.discard(sock)
+
+    # The data received after the queries were stopped may be incomplete
+    if group is not None and group.stopped:
+        return response.raw, _stopped_error(server)
+    return response.result()
+
+
+async def query_whois_server_async(
+    server: str,
+    query: bytes,
+    timeout: float,
+    throttle: Optional[ServerThrottle] = None,
+    group: Optional[_QueryGroup] = None
+) -> Tuple[bytes, Optional[_Error]]:
+    """Asynchronous version of `query_whois_server`.
+
+    :param server: The WHOIS server to query.
+    :param query: The encoded query(ending with CRLF).
+    :param timeout: The timeout for receiving the whole response. The connection has
+        to be made within `CONNECT_TIMEOUT` seconds if that is shorter.
+    :param throttle: If given, the query waits for its turn to be sent to the server.
+    :param group: If given, the query is skipped if another server of the group has
+        the same address. The query is stopped by cancelling its task.
+    :return: The raw response and None, or the data received so far and the error.
+    """
+    if throttle is not None:
+        await throttle.acquire_async(server)
+    loop = asyncio.get_running_loop()
+    # Open a connection to the whois server.
+    debug = _debug_enabled()
+    if debug:
+        log21.debug(f'Connecting to {LBLUE}{server}{RESET}...')
+    try:
+        if group is not None:
+            group.claim(server, await loop.run_in_executor(None, _resolve, server))
+        sock = await _connect_async(server, timeout)
+    except _QuerySkipped as ex:
+        return b'', _skipped_error(server, ex)
+    except socket.error as ex:
+        return b'', _socket_error('connecting to', server, ex)
+
+    with sock:
+        # Send the query to the whois server.
+        if debug:
+            log21.debug(f'Sending query to {LBLUE}{server}{RESET}...')
+        try:
+            await loop.sock_sendall(sock, query)
+        except socket.error as ex:
+            return b'', _socket_error('sending query to', server, ex)
+        # Receive the raw whois data from the whois server.
+        if debug:
+            log21.debug(f'Receiving data from {LBLUE}{server}{RESET}...')
+        response = _Response(server, timeout)
+        try:
+            while True:
+                # Outside the try statement below, since `socket.timeout` is
+                # `asyncio.TimeoutError` in Python 3.11+
+                wait_time = response.wait_time()
+                try:
+                    data = await asyncio.wait_for(
+                        loop.sock_recv(sock, RECV_BUFFER_SIZE), wait_time
+                    )
+                except asyncio.TimeoutError:
+                    if response.idle():
+                        break
+                    continue
+                if not response.feed(data):
+                    break
+        except socket.error as ex:
+            return response.raw, _socket_error('receiving data from', server, ex)
+
+    return response.result()
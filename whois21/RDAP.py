@@ -0,0 +1,256 @@
+# whois21.RDAP.py
+
+import threading
+from typing import (
+    Set, Dict, List, Tuple, Callable, Hashable, Iterable, Optional, Collection
+)
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import log21
+
+from . import JSON, HTTP
+from .HTTP import RDAP_HEADERS
+from .Cache import get_cached, set_cached
+
+__all__ = ['is_valid_rdap', 'fetch_rdap', 'merge_rdap', 'select_fields']
+
+# The keys fetch_rdap needs to validate, deduplicate and follow the RDAP responses
+_REQUIRED_FIELDS = (
+    'links', 'errorCode', 'error', 'objectClassName', 'handle', 'ldhName'
+)
+
+# The maximum number of RDAP requests sent at the same time, in total and to each host
+MAX_WORKERS = 16
+MAX_REQUESTS_PER_HOST = 2
+# The maximum number of links followed from the initial URLs(registry -> registrar ->
+# ... chains are usually 1 or 2 links long)
+MAX_DEPTH = 5
+# The media type of the links that point to more RDAP information
+RDAP_TYPE = 'application/rdap+json'
+
+_executor: Optional[ThreadPoolExecutor] = None
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Returns the thread pool shared by all the RDAP lookups and creates it on the
+    first call.
+
+    :return: The thread pool.
+    """
+    global _executor  # pylint: disable=global-statement
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix='whois21-rdap'
+            )
+        return _executor
+
+
+def _get_host_semaphore(url: str) -> threading.BoundedSemaphore:
+    """Returns the semaphore limiting the number of requests sent to the host of a URL
+    at the same time.
+
+    :param url: The URL.
+    :return: The semaphore.
+    """
+    host = urlsplit(url).netloc
+    with _lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = _host_semaphores[host] = threading.BoundedSemaphore(
+                MAX_REQUESTS_PER_HOST
+            )
+        return semaphore
+
+
+def _fetch(
+    url: str,
+    timeout: int,
+    fields: Optional[Collection[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> Optional[dict]:
+    """Gets the RDAP information from a URL. Successful responses are cached on disk.
+
+    :param url: The URL to get the RDAP information from.
+    :param timeout: The timeout for the request.
+    :param fields: If given, only these keys of the response are deserialized.
+    :param cache_ttl: The number of seconds the response is cached for(default: the
+        value of the `WHOIS21_CACHE_TTL` environment variable). 0 disables the cache.
+    :return: The RDAP response or None if the request failed.
+    """
+    cache_key = url if fields is None else f'{url}#{",".join(fields)}'
+    response_json = get_cached('rdap', cache_key, cache_ttl)
+    if response_json is not None:
+        return response_json
+
+    log21.debug(f'Getting registration data from {url}.')
+    try:
+        with _get_host_semaphore(url):
+            response = HTTP.get(url, timeout=timeout, headers=RDAP_HEADERS)
+        if response.status_code != 200:
+            return None
+        if fields is not None:
+            response_json = JSON.loads_fields(response.content, fields)
+        else:
+            response_json = JSON.loads(response.content)
+        set_cached('rdap', cache_key, response_json, cache_ttl)
+        return response_json
+    except Exception as ex:  # pylint: disable=broad-except
+        log21.debug(
+            f'Error getting RDAP information from {url}:'
+            f' {ex.__class__.__name__}: {ex}'
+        )
+        return None
+
+
+def _identity(url: str, response_json: dict) -> Tuple[Hashable, ...]:
+    """Returns a key identifying the object an RDAP response describes, so the same
+    object returned by different URLs is only used once.
+
+    :param url: The URL the response was fetched from.
+    :param response_json: The RDAP response.
+    :return: The key.
+    """
+    self_link = next(
+        (
+            link.get('href') for link in response_json.get('links', ())
+            if isinstance(link, dict) and link.get('rel') == 'self'
+        ), None
+    )
+    handle = response_json.get('handle')
+    ldh_name = response_json.get('ldhName')
+    if not (self_link or handle or ldh_name):
+        return (url, )
+    return (response_json.get('objectClassName'), handle, ldh_name, self_link)
+
+
+def is_valid_rdap(response_json: dict) -> bool:
+    """Checks if an RDAP response doesn't contain any errors.
+
+    :param response_json: The RDAP response.
+    :return: True if the response is valid, False otherwise.
+    """
+    return not response_json.get('errorCode') and not response_json.get('error')
+
+
+def fetch_rdap(
+    urls: Iterable[str],
+    is_valid: Callable[[dict], bool] = is_valid_rdap,
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None,
+    max_depth: int = MAX_DEPTH
+) -> List[dict]:
+    """Gets the RDAP information from a list of URLs and follows the links in the
+    responses that might have more information.
+
+    The URLs are fetched in parallel, one level of links at a time, using a thread pool
+    shared by all the lookups(at most `MAX_WORKERS` requests in total and
+    `MAX_REQUESTS_PER_HOST` requests to each host at the same time).
+
+    :param urls: The URLs to get the RDAP information from.
+    :param is_valid: A function that checks if an RDAP response should be used.
+    :param timeout: The timeout for each request.
+    :param fields: If given, only these keys(and the ones needed to follow the links)
+        of the responses are deserialized.
+    :param cache_ttl: The number of seconds the responses are cached on disk for
+        (default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
+    :param max_depth: The maximum number of links followed from the initial URLs.
+    :return: A list of dictionaries containing the RDAP information.
+    """
+    if fields is not None:
+        fields = tuple(dict.fromkeys((*fields, *_REQUIRED_FIELDS)))
+    # Maps the identity of each object to its RDAP response
+    rdaps: Dict[Tuple[Hashable, ...], dict] = {}
+    visited: Set[str] = set()
+    frontier = [url for url in urls if url]
+
+    executor = _get_executor()
+    depth = 0
+    while frontier:
+        frontier = [url for url in dict.fromkeys(frontier) if url not in visited]
+        visited.update(frontier)
+        next_frontier = []
+        responses = executor.map(
+            lambda url: _fetch(url, timeout, fields, cache_ttl), frontier
+        )
+        for url, response_json in zip(frontier, responses):
+            if not isinstance(response_json, dict) or not is_valid(response_json):
+                continue
+            # The links of an object that was already found have been followed
+            identity = _identity(url, response_json)
+            if identity in rdaps:
+                continue
+            rdaps[identity] = response_json
+
+            if depth >= max_depth:
+                continue
+            # Checks if there is another RDAP link that might have more information.
+            for link in response_json.get('links', ()):
+                get = link.get
+                if get('type') == RDAP_TYPE and get('rel') != 'self':
+                    href = get('href')
+                    if href:
+                        next_frontier.append(href)
+        frontier = next_frontier
+        depth += 1
+
+    return list(rdaps.values())
+
+
+def merge_rdap(dst: dict, src: dict) -> dict:
+    """Merges an RDAP response into another one.
+
+    The keys missing from `dst` are copied from `src`, lists present in both are
+    concatenated and dictionaries present in both are merged the same way. Any other
+    value already present in `dst` is kept.
+
+    :param dst: The dictionary to merge the information into.
+    :param src: The RDAP response to merge.
+    :return: `dst`
+    """
+    # pylint: disable=unidiomatic-typecheck
+    stack = [(dst, src)]
+    # Local names are faster to look up than globals and attributes
+    pop, push = stack.pop, stack.append
+    while stack:
+        dst_, src_ = pop()
+        common = dst_.keys() & src_.keys()
+        # The missing keys are copied in bulk and only the common ones are merged
+        if not common:
+            dst_.update(src_)
+            continue
+        if len(common) < len(src_):
+            dst_.update(
+                {
+                    key: value
+                    for key, value in src_.items() if key not in common
+                }
+            )
+        for key in common:
+            current, value = dst_[key], src_[key]
+            # Decoded JSON only contains plain lists and dictionaries, so exact type
+            # checks are enough and are cheaper than `isinstance`
+            current_type = type(current)
+            if current_type is list:
+                if type(value) is list:
+                    current.extend(value)
+            elif current_type is dict and type(value) is dict:
+                push((current, value))
+    return dst
+
+
+def select_fields(info: dict, fields: Optional[Iterable[str]]) -> dict:
+    """Returns the given keys of the registration data.
+
+    :param info: The registration data.
+    :param fields: The keys to select or None to select all of them.
+    :return: A dictionary containing the selected keys.
+    """
+    if fields is None:
+        return info
+    return {key: info[key] for key in fields if key in info}
@@ -1,30 +1,48 @@
 # whois21.__init__.py
 
 import os
-import json
-import socket
+import re
+import sys
+import time
+import atexit
+import base64
+import asyncio
 import string
-from typing import Any, Set, Dict, List, Tuple, Union, Optional, Sequence
+import functools
+import itertools
+import threading
+from typing import (Any, Set, Dict, List, Tuple, Union, Hashable, Iterable,
+                    Optional, FrozenSet, Sequence)
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import log21
-import chardet
-import requests
-import importlib_resources
-from log21.Colors import (RED, BLUE, GREEN, RESET, LIGHT_RED as LRED,
-                          LIGHT_BLUE as LBLUE, LIGHT_CYAN as LCYAN,
-                          LIGHT_GREEN as LGREEN)
+from log21.Colors import (BLUE, GREEN, RESET, LIGHT_RED as LRED,
+                          LIGHT_CYAN as LCYAN, LIGHT_GREEN as LGREEN)
 
 from whois21.IP import (validate_ip, get_ipv4_services, get_ipv6_services,
                         download_ipv4_json, download_ipv6_json,
-                        ip_registration_data_lookup, ip_registration_data_lookup_)
+                        ip_registration_data_lookup, ip_registration_data_lookup_,
+                        ip_registration_data_lookup_async,
+                        bulk_ip_registration_data_lookup)
+from whois21 import JSON
 from whois21.API import lookup_ip_ip_api, batch_lookup_ip_ip_api
+from whois21.HTTP import download_file
+from whois21.Query import (ServerThrottle, _Error, _QueryGroup, _is_skipped,
+                           _debug_enabled, query_whois_server,
+                           query_whois_server_async)
+from whois21.Cache import get_cached, set_cached, get_cache_ttl
+from whois21.Bootstrap import download_bootstraps, clear_bootstrap_cache
 from whois21.ASN import (get_asn_dict, validate_asn, get_asn_services,
-                         download_asn_json, asn_registration_data_lookup,
-                         asn_registration_data_lookup_)
+                         clear_asn_services_cache, download_asn_json,
+                         asn_registration_data_lookup, asn_registration_data_lookup_,
+                         asn_registration_data_lookup_async)
 from whois21.DNS import (get_dns_dict, get_dns_services, download_dns_json,
+                         clear_dns_services_cache,
                          domain_registration_data_lookup,
-                         domain_registration_data_lookup_)
+                         domain_registration_data_lookup_,
+                         domain_registration_data_lookup_async)
 
 __version__ = '1.4.6'
 __github__ = 'https://github.com/MPCodeWriter21/whois21'
@@ -35,43 +53,108 @@ __license__ = 'Apache License 2.0'
 __all__ = [
     '__version__', '__github__', '__author__', '__email__', '__license__',
     'validate_asn', 'download_asn_json', 'get_asn_dict', 'get_asn_services',
+    'clear_service_cache', 'download_bootstraps', 'clear_bootstrap_cache',
     'asn_registration_data_lookup_', 'asn_registration_data_lookup',
-    'download_ipv4_json', 'download_ipv6_json', 'get_ipv4_services',
-    'get_ipv6_services', 'ip_registration_data_lookup_', 'ip_registration_data_lookup',
+    'asn_registration_data_lookup_async', 'download_ipv4_json', 'download_ipv6_json',
+    'get_ipv4_services', 'get_ipv6_services', 'ip_registration_data_lookup_',
+    'ip_registration_data_lookup', 'ip_registration_data_lookup_async',
+    'bulk_ip_registration_data_lookup',
     'download_dns_json', 'get_dns_dict', 'get_dns_services',
     'domain_registration_data_lookup_', 'domain_registration_data_lookup',
-    'validate_ip', 'WHOIS', 'registration_data_lookup', 'get_whois_servers',
+    'domain_registration_data_lookup_async', 'validate_ip', 'is_known_tld', 'WHOIS',
+    'ServerThrottle', 'bulk_whois', 'AsyncWHOIS', 'bulk_whois_async',
+    'registration_data_lookup', 'registration_data_lookup_async',
+    'bulk_registration_data_lookup', 'get_whois_servers',
     'whois_servers', 'vcard_map', 'lookup_ip_ip_api', 'batch_lookup_ip_ip_api'
 ]
 
 STRIP_CHARS = string.whitespace + '<>'
+# The prefixes of the comment lines in WHOIS responses
+COMMENT_PREFIXES = ('%', '#')
+# The keys different WHOIS servers use for the same dates, in order of preference
+UPDATED_DATE_KEYS = ('UPDATED DATE', 'UPDATED', 'LAST UPDATED')
+CREATION_DATE_KEYS = ('CREATION DATE', 'CREATED DATE', 'CREATED')
+EXPIRES_DATE_KEYS = (
+    'REGISTRY EXPIRY DATE', 'EXPIRY DATE', 'REGISTRAR REGISTRATION EXPIRATION DATE'
+)
+# The number of seconds the successful WHOIS responses are kept in memory for(0
+# disables the cache) and the maximum number of responses kept
+WHOIS_CACHE_TTL = 900
+WHOIS_CACHE_SIZE = 4096
+# The number of seconds the successful WHOIS responses are kept on disk for, so they
+# are reused by other processes too. 0(default) disables the disk cache
+WHOIS_DISK_CACHE_TTL = 0
+# The number of servers queried first when the servers are queried in parallel and the
+# number of seconds they have to respond before the rest of the servers are queried
+WAVE_SIZE = 2
+WAVE_DELAY = 1.0
+# The number of seconds the success rates and latencies of the WHOIS servers are kept
+# on disk for after they were last saved and the minimum number of seconds between
+# the saves(they are also saved when the program exits). They aren't saved when the
+# cache is disabled(`WHOIS21_CACHE_TTL=0`)
+SERVER_STATS_TTL = 30 * 86400
+SERVER_STATS_SAVE_INTERVAL = 60
+
+# Maps the domains and the options of the queries to the time the responses were
+# cached, the raw responses, the parsed data and the servers that were used, from the
+# least to the most recently used
+_CachedWhois = Tuple[float, bytes, dict, Set[str]]
+_whois_cache: 'OrderedDict[Tuple[Hashable, ...], _CachedWhois]' = OrderedDict()
+_whois_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _package_path(name: str) -> str:
+    """Returns the path of a file in the whois21 package directory. It is only
+    resolved once.
+
+    :param name: The name of the file.
+    :return: The path of the file.
+    """
+    # pylint: disable=import-outside-toplevel
+    if sys.version_info >= (3, 9):
+        import importlib.resources as importlib_resources
+    else:
+        import importlib_resources
+    return str(importlib_resources.files('whois21') / name)
+
+
+def clear_service_cache() -> None:
+    """Clears the in-memory caches of the RDAP bootstrap files and the services read
+    from them."""
+    clear_bootstrap_cache()
+    clear_asn_services_cache()
+    clear_dns_services_cache()
 
 
 def download_whois_servers(
-    *, path: Optional[Union[str, os.PathLike]] = None, timeout: int = 10
+    *,
+    path: Optional[Union[str, os.PathLike]] = None,
+    timeout: int = 10,
+    conditional: bool = False
 ) -> str:
     """Downloads the whois whois-servers.txt file from
     https://www.nirsoft.net/whois-servers.txt.
 
     :param path: The path to the whois file.
     :param timeout: The timeout for the request.
+    :param conditional: If True, the file is only downloaded if it has changed on the
+        server since the last download(using its ETag and modification time).
     :return: The path to the downloaded file.
     """
     if not path:
-        path = str(importlib_resources.files('whois21') / 'whois-servers.txt')
-
-    if not os.path.exists(path):
-        os.makedirs(os.path.dirname(path), exist_ok=True)
+        path = _package_path('whois-servers.txt')
 
     log21.debug(
         f'Downloading {LGREEN}whois-servers.txt{RESET} file to `{BLUE}{path}{RESET}`'
     )
 
-    with open(path, 'wb') as file:
-        file.write(
-            requests.get('https://www.nirsoft.net/whois-servers.txt',
-                         timeout=timeout).content
-        )
+    download_file(
+        'https://www.nirsoft.net/whois-servers.txt',
+        path,
+        timeout=timeout,
+        conditional=conditional
+    )
 
     return str(path)
 
@@ -81,31 +164,50 @@ def get_whois_servers(
 ):
     """Returns a dictionary of the whois-servers.txt file.
 
-    :param force_download: If True, the whois-servers.txt file will be downloaded again.
+    :param force_download: If True, the whois-servers.txt file will be downloaded again
+        if it has changed on the server.
     :param path: The path to the whois-servers.txt file.
     :return: A dictionary of the whois-servers.txt file.
     """
     if not path:
-        path = str(importlib_resources.files('whois21') / 'whois-servers.txt')
+        path = _package_path('whois-servers.txt')
 
-    if not os.path.exists(path) or force_download:
-        download_whois_servers(path=path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        stat = None
 
-    if os.stat(path).st_size == 0:
+    if stat is None or stat.st_size == 0:
         download_whois_servers(path=path)
+        stat = os.stat(path)
+    elif force_download:
+        # The file is only transferred again if it has changed on the server
+        download_whois_servers(path=path, conditional=True)
+        stat = os.stat(path)
+
+    # The parsed file is cached until the file changes, so importing whois21 doesn't
+    # parse it every time
+    cache_key = f'{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}'
+    data = get_cached('whois-servers', cache_key)
+    if isinstance(data, dict):
+        return data
 
-    data = {}
     with open(path, 'r', encoding='utf-8') as file:
-        for line in file:
-            if line.startswith(';') or ' ' not in line:
-                continue
-            key, value = line.split(' ', 1)
-            data[key] = value.strip(' \n')
-
+        text = file.read()
+    data = {}
+    for line in text.splitlines():
+        if line[:1] == ';':
+            continue
+        key, sep, value = line.partition(' ')
+        if sep:
+            data[key] = value.strip(' ')
+
+    set_cached('whois-servers', cache_key, data)
     return data
 
 
-whois_servers: dict = {
+# The WHOIS servers that are known besides the ones in whois-servers.txt
+_STATIC_WHOIS_SERVERS: dict = {
     'ABUSE_HOST': 'whois.abuse.net',
     # Types of queries: POCs, ownerid, CIDR blocks, IP and AS numbers.
     'LNICHOST': 'whois.lacnic.net',
@@ -156,12 +258,323 @@ whois_servers: dict = {
     'za': {'whois.registry.net.za'}
 }
 
-for _key, _value in get_whois_servers().items():
-    whois_servers[_key] = {*whois_servers.get(_key, {}), _value}
 
-with open(str(importlib_resources.files('whois21') / 'vcard-map.json'), 'r',
-          encoding='utf-8') as f:
-    vcard_map = json.load(f)
+@functools.lru_cache(maxsize=None)
+def _get_whois_servers() -> Dict[str, Any]:
+    """Merges the known WHOIS servers with the ones in the whois-servers.txt file. It
+    is only done when the servers are used for the first time, so importing whois21
+    doesn't read(or download) the file.
+
+    :return: A dictionary mapping the TLDs(and a few special keys) to their servers.
+    """
+    servers: Dict[str, Any] = {}
+    for key, value in _STATIC_WHOIS_SERVERS.items():
+        # Frozen sets are smaller and can't be modified by accident
+        servers[key] = frozenset(value) if isinstance(value, set) else value
+    for key, value in get_whois_servers().items():
+        servers[key] = frozenset((*servers.get(key, ()), value))
+    return servers
+
+
+@functools.lru_cache(maxsize=None)
+def _get_vcard_map() -> Dict[str, str]:
+    """Loads the vcard-map.json file that maps the vCard properties to WHOIS keys. It
+    is only loaded when it is used for the first time.
+
+    :return: A dictionary of the vcard-map.json file.
+    """
+    return JSON.load(_package_path('vcard-map.json'))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_iana_tlds() -> FrozenSet[str]:
+    """Loads the iana-tlds.txt file that lists the top-level domains. It is only loaded
+    when it is used for the first time.
+
+    :return: A set of the lowercase(and punycode encoded) TLDs.
+    """
+    with open(_package_path('iana-tlds.txt'), 'r', encoding='utf-8') as file:
+        return frozenset(
+            line.strip().lower() for line in file
+            if line.strip() and not line.startswith('#')
+        )
+
+
+def is_known_tld(tld: str) -> bool:
+    """Checks if a TLD is in the list of top-level domains shipped with whois21.
+
+    :param tld: The TLD.
+    :return: True if the TLD exists, False otherwise.
+    """
+    try:
+        tld = tld.encode('idna').decode('ascii')
+    except UnicodeError:
+        return False
+    return tld.lower() in _get_iana_tlds()
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_tld_servers(tld: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """Returns the known WHOIS servers of a TLD and the servers guessed from its name.
+
+    :param tld: The TLD.
+    :return: The known servers and the guessed servers that aren't known.
+    """
+    known = _get_whois_servers().get(tld, frozenset())
+    if isinstance(known, str):
+        known = frozenset((known, ))
+    # The servers of TLDs that don't exist can't be resolved, and trying them wastes
+    # the whole timeout
+    if not is_known_tld(tld):
+        return known, frozenset()
+    return known, frozenset((tld + '.whois-servers.net', 'whois.nic.' + tld)) - known
+
+
+def __getattr__(name: str) -> Any:
+    # `vcard_map` and `whois_servers` are loaded lazily
+    if name == 'vcard_map':
+        return _get_vcard_map()
+    if name == 'whois_servers':
+        return _get_whois_servers()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+@functools.lru_cache(maxsize=None)
+def _get_chardet() -> Any:
+    """Imports the module used to detect the encodings of the WHOIS responses. It is
+    only imported when it is used for the first time, since most responses are ASCII
+    or UTF-8.
+
+    :return: The cchardet module if it is installed, otherwise the chardet module.
+    """
+    # pylint: disable=import-outside-toplevel
+    try:
+        # The C++ uchardet bindings are much faster than the pure Python chardet
+        import cchardet as chardet
+    except ImportError:
+        import chardet
+    return chardet
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_iso_datetime(date_time: str) -> Optional[datetime]:
+    """Parses an ISO 8601 date time string. The results are cached, since the same
+    dates appear in the responses of many domains.
+
+    :param date_time: The date time string.
+    :return: The parsed date time or None if the string is not a valid date time.
+    """
+    try:
+        return datetime.fromisoformat(date_time)
+    except ValueError:
+        pass
+    # Most WHOIS servers use the "Z" suffix for UTC, which `fromisoformat` only
+    # accepts since Python 3.11
+    if date_time[-1:] in ('Z', 'z'):
+        try:
+            return datetime.fromisoformat(date_time[:-1] + '+00:00')
+        except ValueError:
+            pass
+    return None
+
+
+def _parse_time(date_time: Union[str, Sequence[str]]) -> Union[List[datetime], None]:
+    """Parses a date time string.
+
+    :param date_time: The date time string.
+    :return: The parsed date time.
+    """
+    if isinstance(date_time, str):
+        parsed = _parse_iso_datetime(date_time)
+        return [parsed] if parsed is not None else None
+    if isinstance(date_time, Sequence):
+        result = []
+        for date in date_time:
+            try:
+                parsed = _parse_iso_datetime(date)
+            except TypeError:
+                log21.debug(
+                    "WHOIS: __set_attrs: parse_time: TypeError:",
+                    f"{date_time = }, {type(date_time) = }"
+                )
+                continue
+            if parsed is not None:
+                result.append(parsed)
+        return result if result else None
+    return None
+
+
+def _first_of(data: dict, keys: Sequence[str]) -> Any:
+    """Returns the first non-empty value of the keys in a dictionary.
+
+    :param data: The dictionary.
+    :param keys: The keys in order of preference.
+    :return: The value or '' if none of the keys have a value.
+    """
+    for key in keys:
+        value = data.get(key)
+        if value:
+            return value
+    return ''
+
+
+# Matches the "key: value" lines of WHOIS responses that aren't comments. If a key
+# has no value on its line, the third group contains the next lines until the next
+# key(its value and comments)
+_KEY_VALUE_RE = re.compile(
+    r'^(?![%#])([^:\n]*):(?:([^\n]+)|((?:\n(?:[%#][^\n]*|[^:\n]*)(?![^\n]))*))',
+    re.MULTILINE
+)
+
+# Matches the "whois:" line of the responses of whois.iana.org and captures the WHOIS
+# server of the TLD
+_IANA_WHOIS_RE = re.compile(rb'^whois:[ \t]*([^\s]+)', re.MULTILINE)
+
+
+def _copy_whois_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Copies parsed WHOIS data, so the cached data isn't changed through the WHOIS
+    objects.
+
+    :param data: The parsed WHOIS data.
+    :return: The copy.
+    """
+    return {
+        key: value.copy() if isinstance(value, list) else value
+        for key, value in data.items()
+    }
+
+
+# Maps the WHOIS servers to their number of successful and failed queries and the
+# average time of their successful queries in milliseconds. They are loaded from the
+# disk on first use and saved at most every `SERVER_STATS_SAVE_INTERVAL` seconds
+_server_stats: Dict[str, Dict[str, float]] = {}
+_server_stats_lock = threading.Lock()
+_server_stats_loaded = False
+_server_stats_changed = False
+_server_stats_saved = time.monotonic()
+
+
+def _get_server_stats(server: str) -> Dict[str, float]:
+    """Returns the statistics of a WHOIS server. The statistics of all the servers are
+    loaded from the disk the first time. Must be called with `_server_stats_lock`
+    held.
+
+    :param server: The WHOIS server.
+    :return: The statistics of the server.
+    """
+    global _server_stats_loaded  # pylint: disable=global-statement
+    if not _server_stats_loaded:
+        _server_stats_loaded = True
+        cached = None
+        if get_cache_ttl():
+            cached = get_cached('whois-server-stats', 'all', SERVER_STATS_TTL)
+        if isinstance(cached, dict):
+            for name, cached_stats in cached.items():
+                if isinstance(cached_stats, dict):
+                    stats = _server_stats.setdefault(
+                        name, {
+                            'success': 0,
+                            'fail': 0,
+                            'avg_latency_ms': 0.0
+                        }
+                    )
+                    stats.update(
+                        (key, cached_stats[key]) for key in stats
+                        if isinstance(cached_stats.get(key), (int, float))
+                    )
+    stats = _server_stats.get(server)
+    if stats is None:
+        stats = _server_stats[server] = {'success': 0, 'fail': 0, 'avg_latency_ms': 0.0}
+    return stats
+
+
+def _save_server_stats() -> None:
+    """Saves the statistics of the WHOIS servers on the disk if they have changed
+    since they were last saved. Does nothing if the cache is disabled."""
+    # pylint: disable=global-statement
+    global _server_stats_changed, _server_stats_saved
+    with _server_stats_lock:
+        if not _server_stats_changed:
+            return
+        _server_stats_changed = False
+        _server_stats_saved = time.monotonic()
+        stats = {server: dict(stats) for server, stats in _server_stats.items()}
+    if get_cache_ttl():
+        set_cached('whois-server-stats', 'all', stats, SERVER_STATS_TTL)
+
+
+atexit.register(_save_server_stats)
+
+
+def _server_score(server: str) -> float:
+    """Returns how likely a WHOIS server is to respond quickly with valid data, based
+    on its previous queries.
+
+    :param server: The WHOIS server.
+    :return: The success rate of the server(0.5 for unknown servers) minus 0.1 for
+        each second its successful queries take on average.
+    """
+    with _server_stats_lock:
+        stats = _get_server_stats(server)
+        success, fail = stats['success'], stats['fail']
+        return (success + 1) / (success + fail + 2) - stats['avg_latency_ms'] / 10000
+
+
+def _record_server_query(server: str, success: bool, latency: float) -> None:
+    """Updates the statistics of a WHOIS server after a query. The statistics are
+    saved on the disk if they weren't saved in the last `SERVER_STATS_SAVE_INTERVAL`
+    seconds.
+
+    :param server: The WHOIS server.
+    :param success: Whether the server responded with valid data.
+    :param latency: The number of seconds the query took.
+    """
+    global _server_stats_changed  # pylint: disable=global-statement
+    with _server_stats_lock:
+        stats = _get_server_stats(server)
+        if success:
+            stats['success'] += 1
+            stats['avg_latency_ms'] += (latency * 1000 -
+                                        stats['avg_latency_ms']) / stats['success']
+        else:
+            stats['fail'] += 1
+        _server_stats_changed = True
+        save = time.monotonic() - _server_stats_saved >= SERVER_STATS_SAVE_INTERVAL
+    if save:
+        _save_server_stats()
+
+
+# Maps the TLDs to the time the WHOIS servers whois.iana.org referred them to were
+# cached and the servers('' if IANA doesn't know a WHOIS server for the TLD)
+_iana_servers: Dict[str, Tuple[float, str]] = {}
+
+
+def _get_iana_server(tld: str) -> Optional[str]:
+    """Returns the cached WHOIS server whois.iana.org referred a TLD to.
+
+    The servers are kept in memory and on disk for `WHOIS21_CACHE_TTL` seconds.
+
+    :param tld: The TLD.
+    :return: The WHOIS server, '' if IANA doesn't know one or None if it isn't cached.
+    """
+    cached = _iana_servers.get(tld)
+    if cached is not None and time.monotonic() - cached[0] < get_cache_ttl():
+        return cached[1]
+    server = get_cached('iana', tld)
+    if isinstance(server, str):
+        _iana_servers[tld] = (time.monotonic(), server)
+        return server
+    return None
+
+
+def _set_iana_server(tld: str, server: str) -> None:
+    """Caches the WHOIS server whois.iana.org referred a TLD to.
+
+    :param tld: The TLD.
+    :param server: The WHOIS server or '' if IANA doesn't know one.
+    """
+    _iana_servers[tld] = (time.monotonic(), server)
+    set_cached('iana', tld, server)
 
 
 class WHOIS:  # pylint: disable=too-many-instance-attributes
@@ -171,11 +584,20 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
     __error: Optional[Tuple[str, Optional[Exception]]] = None
     __raw: bytes = b''
     __servers: Set[str] = set()
+    # The servers that were only guessed from the TLD and are queried last
+    __guessed_servers: Set[str] = set()
+    # The server whois.iana.org referred the domain to, which is queried first
+    __referred_server: Optional[str] = None
     __whois_data: dict = {}
     __rdap_data: dict = {}
     __encode_encoding: str = 'utf-8'
     __decode_encoding: Optional[str] = None
+    # The last raw data whose encoding was detected and its encoding
+    __detected_encoding: Tuple[Optional[bytes], str] = (None, 'utf-8')
     __encoding_errors: str = 'strict'
+    __throttle: Optional[ServerThrottle] = None
+    # The encoded query sent to the whois servers
+    __query: bytes = b''
     timeout: int = 10
 
     def __init__(
@@ -190,6 +612,8 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         encode_encoding: str = 'utf-8',
         decode_encoding: Optional[str] = None,
         encoding_errors: str = 'strict',
+        parallel: bool = True,
+        throttle: Optional[ServerThrottle] = None,
     ):
         """Initialize WHOIS object.
 
@@ -202,6 +626,10 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         :param encode_encoding: Encoding to use for encoding. (default: utf-8)
         :param decode_encoding: Encoding to use for decoding. (default: AUTODETECT)
         :param encoding_errors: Encoding error handling. (default: strict)
+        :param parallel: Query all the WHOIS servers at the same time and use the first
+            valid response. (default: True)
+        :param throttle: A ServerThrottle that limits the queries sent to each WHOIS
+            server. (default: None)
         """
         self.registry_domain_id = None
         self.registrar_whois_server = None
@@ -221,6 +649,8 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         self.__domain = domain.lower() if domain else self.__domain
         self.__success = False
         self.__servers = set(servers) if servers else set()
+        self.__guessed_servers = set()
+        self.__referred_server = None
         self.__whois_data = {}
         self.timeout = timeout
         self.__error = None
@@ -228,6 +658,7 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         self.__encode_encoding = encode_encoding
         self.__decode_encoding = decode_encoding
         self.__encoding_errors = encoding_errors
+        self.__throttle = throttle
 
         if run_whois:
             self.whois(
@@ -239,6 +670,8 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
                 encode_encoding=encode_encoding,
                 decode_encoding=decode_encoding,
                 encoding_errors=encoding_errors,
+                parallel=parallel,
+                throttle=throttle,
             )
 
     def whois(
@@ -252,6 +685,8 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         encode_encoding: str = 'utf-8',
         decode_encoding: Optional[str] = None,
         encoding_errors: str = 'strict',
+        parallel: bool = True,
+        throttle: Optional[ServerThrottle] = None,
     ):
         """Queries the whois server for the domain.
 
@@ -265,10 +700,91 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         :param encode_encoding: Encoding to use for encoding. (default: utf-8)
         :param decode_encoding: Encoding to use for decoding. (default: AUTODETECT)
         :param encoding_errors: How to handle encoding errors. (default: strict)
+        :param parallel: If True, all the whois servers are queried at the same time
+            and the first valid response is used. Otherwise, they are queried one by
+            one. (default: True)
+        :param throttle: If given, the queries wait for their turns to be sent to the
+            WHOIS servers. (default: None)
+        """
+        self.__reset(
+            domain, servers, timeout, encode_encoding, decode_encoding, encoding_errors,
+            throttle
+        )
+
+        if not force_rdap:
+            self.__whois(parallel)
+
+        if (not self.__success and use_rdap) or force_rdap:
+            self.__rdap()
+
+        self.__set_attrs()
+
+    async def whois_async(
+        self,
+        domain: Optional[str] = None,
+        *,
+        servers: Optional[Sequence[str]] = None,
+        timeout: int = 10,
+        use_rdap: bool = True,
+        force_rdap: bool = False,
+        encode_encoding: str = 'utf-8',
+        decode_encoding: Optional[str] = None,
+        encoding_errors: str = 'strict',
+        parallel: bool = True,
+        throttle: Optional[ServerThrottle] = None,
+    ):
+        """Asynchronous version of `whois`.
+
+        The WHOIS servers are queried with asyncio streams, so thousands of lookups
+        can run concurrently in one thread. The RDAP lookup runs in the default
+        executor of the running event loop.
+
+        :param domain: The domain/ip to query.
+        :param servers: The servers to use.
+        :param timeout: The timeout in seconds.
+        :param use_rdap: If True, the RDAP server will be used if the whois servers
+            don't respond.
+        :param force_rdap: If True, the RDAP server will be used even if the whois
+            servers respond.
+        :param encode_encoding: Encoding to use for encoding. (default: utf-8)
+        :param decode_encoding: Encoding to use for decoding. (default: AUTODETECT)
+        :param encoding_errors: How to handle encoding errors. (default: strict)
+        :param parallel: If True, all the whois servers are queried at the same time
+            and the first valid response is used. Otherwise, they are queried one by
+            one. (default: True)
+        :param throttle: If given, the queries wait for their turns to be sent to the
+            WHOIS servers. (default: None)
         """
+        self.__reset(
+            domain, servers, timeout, encode_encoding, decode_encoding, encoding_errors,
+            throttle
+        )
+
+        if not force_rdap:
+            await self.__whois_async(parallel)
+
+        if (not self.__success and use_rdap) or force_rdap:
+            await asyncio.get_running_loop().run_in_executor(None, self.__rdap)
+
+        self.__set_attrs()
+
+    def __reset(
+        self,
+        domain: Optional[str],
+        servers: Optional[Sequence[str]],
+        timeout: int,
+        encode_encoding: str,
+        decode_encoding: Optional[str],
+        encoding_errors: str,
+        throttle: Optional[ServerThrottle],
+    ):
+        """Resets the results of the last query and sets the options of the next
+        one."""
         self.__domain = domain.lower() if domain else self.__domain
         self.__success = False
         self.__servers = set(servers) if servers else set()
+        self.__guessed_servers = set()
+        self.__referred_server = None
         self.__whois_data = {}
         self.timeout = timeout
         self.__error = None
@@ -276,14 +792,11 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         self.__encode_encoding = encode_encoding
         self.__decode_encoding = decode_encoding
         self.__encoding_errors = encoding_errors
-
-        if not force_rdap:
-            self.__whois()
-
-        if (not self.__success and use_rdap) or force_rdap:
-            self.__rdap()
-
-        self.__set_attrs()
+        self.__throttle = throttle
+        # The query is encoded once for all the servers
+        self.__query = str(self.__domain).encode(
+            encode_encoding, errors=encoding_errors
+        ) + b'\r\n'
 
     def __set_attrs(self):
         data = self.__whois_data
@@ -330,56 +843,22 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
             nserver = [nserver]
         self.name_servers = name_servers + nserver
 
-        def parse_time(
-            date_time: Union[str, Sequence[str]]
-        ) -> Union[List[datetime], None]:
-            """Parses a date time string.
-
-            :param date_time: The date time string.
-            :return: The parsed date time.
-            """
-            if isinstance(date_time, str):
-                try:
-                    return [datetime.fromisoformat(date_time)]
-                except ValueError:
-                    return None
-            else:
-                if isinstance(date_time, Sequence):
-                    result = []
-                    for date in date_time:
-                        try:
-                            result.append(datetime.fromisoformat(date))
-                        except ValueError:
-                            pass
-                        except TypeError:
-                            log21.debug(
-                                "WHOIS: __set_attrs: parse_time: TypeError:",
-                                f"{date_time = }, {type(date_time) = }"
-                            )
-                    return result if result else None
-            return None
-
         # Convert the dates to datetime objects.
-        updated_date = (
-            data.get('UPDATED DATE', '') or data.get('UPDATED', '')
-            or data.get('LAST UPDATED', '')
-        )
-        creation_date = (
-            data.get('CREATION DATE', '') or data.get('CREATED DATE', '')
-            or data.get('CREATED', '')
-        )
-        expires_date = (
-            data.get('REGISTRY EXPIRY DATE', '') or data.get('EXPIRY DATE', '')
-            or data.get('REGISTRAR REGISTRATION EXPIRATION DATE', '')
-        )
+        updated_date = _first_of(data, UPDATED_DATE_KEYS)
+        creation_date = _first_of(data, CREATION_DATE_KEYS)
+        expires_date = _first_of(data, EXPIRES_DATE_KEYS)
         if updated_date:
-            self.updated_date = parse_time(updated_date)
+            self.updated_date = _parse_time(updated_date)
         if creation_date:
-            self.creation_date = parse_time(creation_date)
+            self.creation_date = _parse_time(creation_date)
         if expires_date:
-            self.expires_date = parse_time(expires_date)
+            self.expires_date = _parse_time(expires_date)
+
+    def __whois(self, parallel: bool = True):
+        cache_key = self.__cache_key
+        if self.__load_cached_whois(cache_key):
+            return
 
-    def __whois(self):
         if not self.__servers:
             # Collects a set of whois servers to use.
             self.__whois_iana()
@@ -390,9 +869,10 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
             log21.debug('No whois servers found.')
             return
 
-        log21.debug(f'WHOIS servers: {GREEN}{log21.pformat(self.__servers)}{RESET}')
+        if _debug_enabled():
+            log21.debug(f'WHOIS servers: {GREEN}{log21.pformat(self.__servers)}{RESET}')
 
-        self.__call_whois_servers()
+        self.__call_whois_servers(parallel)
 
         if self.__error:
             return
@@ -400,227 +880,453 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         self.__success = True
         self.__error = None
         log21.debug(f'{LGREEN}WHOIS data successfully parsed.{RESET}')
+        self.__cache_whois(cache_key)
 
-    def __whois_iana(self):
-        # Send a query to the whois.iana.org server to find the whois server for the
-        # domain.
-        # Create a socket connection to the whois.iana.org server.
-        log21.debug(f'Connecting to {LBLUE}whois.iana.org:43{RESET}...')
-        try:
-            sock = socket.create_connection(('whois.iana.org', 43))
-            sock.settimeout(self.timeout)
-        except socket.error as ex:
-            log21.debug(
-                f'Error connecting to "{RED}whois.iana.org:43{RESET}": '
-                f'{LRED}{ex.__class__.__name__}: {ex}{RESET}'
-            )
-            self.__error = (
-                'Error connecting "to whois.iana.org:43": '
-                f'{ex.__class__.__name__}: {ex}', ex
-            )
+    async def __whois_async(self, parallel: bool = True):
+        cache_key = self.__cache_key
+        if self.__load_cached_whois(cache_key):
             return
-        # Send the domain name to the whois.iana.org server.
-        log21.debug(f'Sending query for {LCYAN}{self.domain}{RESET}...')
-        try:
-            sock.send(
-                str(self.domain
-                    ).encode(self.__encode_encoding, errors=self.__encoding_errors) +
-                b'\r\n'
-            )
-        except socket.error as ex:
-            log21.debug(
-                f'Error sending query to "{RED}whois.iana.org:43{RESET}": '
-                f'{LRED}{ex.__class__.__name__}: {ex}{RESET}'
-            )
-            self.__error = (
-                'Error sending query to "whois.iana.org:43": '
-                f'{ex.__class__.__name__}: {ex}', ex
+
+        if not self.__servers:
+            # Collects a set of whois servers to use.
+            await self.__whois_iana_async()
+            self.__get_whois_server_for_tld()
+
+        if not self.__servers:
+            self.__error = ('No whois servers found.', None)
+            log21.debug('No whois servers found.')
+            return
+
+        if _debug_enabled():
+            log21.debug(f'WHOIS servers: {GREEN}{log21.pformat(self.__servers)}{RESET}')
+
+        await self.__call_whois_servers_async(parallel)
+
+        if self.__error:
+            return
+
+        self.__success = True
+        self.__error = None
+        log21.debug(f'{LGREEN}WHOIS data successfully parsed.{RESET}')
+        self.__cache_whois(cache_key)
+
+    @property
+    def __cache_key(self) -> Tuple[Hashable, ...]:
+        """The key of the response of the query in the in-memory cache."""
+        return (
+            self.__domain, tuple(sorted(self.__servers)), self.__encode_encoding,
+            self.__decode_encoding, self.__encoding_errors
+        )
+
+    def __load_cached_whois(self, cache_key: Tuple[Hashable, ...]) -> bool:
+        """Uses the cached response of the query if it hasn't expired.
+
+        :param cache_key: The key of the response.
+        :return: True if the cached response was used, False otherwise.
+        """
+        cached = None
+        if WHOIS_CACHE_TTL:
+            with _whois_cache_lock:
+                cached = _whois_cache.get(cache_key)
+                if cached is not None:
+                    if time.monotonic() - cached[0] >= WHOIS_CACHE_TTL:
+                        del _whois_cache[cache_key]
+                        cached = None
+                    else:
+                        _whois_cache.move_to_end(cache_key)
+        if cached is None:
+            cached = self.__load_disk_cached_whois(cache_key)
+            if cached is None:
+                return False
+        log21.debug(f'Using the cached WHOIS data of {LCYAN}{self.domain}{RESET}.')
+        _, self.__raw, data, servers = cached
+        self.__whois_data = _copy_whois_data(data)
+        self.__servers = set(servers)
+        self.__success = True
+        self.__error = None
+        return True
+
+    def __cache_whois(self, cache_key: Tuple[Hashable, ...]):
+        """Caches the successful response of the query in memory.
+
+        :param cache_key: The key of the response.
+        """
+        if WHOIS_DISK_CACHE_TTL:
+            set_cached(
+                'whois', repr(cache_key), {
+                    'raw': base64.b64encode(self.__raw).decode('ascii'),
+                    'data': self.__whois_data,
+                    'servers': sorted(self.__servers)
+                }, WHOIS_DISK_CACHE_TTL
             )
+        if not WHOIS_CACHE_TTL:
             return
-        # Receive the raw data from the whois.iana.org server.
-        self.__raw = b''
-        log21.debug('Receiving data...')
+        cached = (
+            time.monotonic(), self.__raw, _copy_whois_data(self.__whois_data),
+            set(self.__servers)
+        )
+        with _whois_cache_lock:
+            _whois_cache[cache_key] = cached
+            _whois_cache.move_to_end(cache_key)
+            while len(_whois_cache) > WHOIS_CACHE_SIZE:
+                _whois_cache.popitem(last=False)
+
+    @staticmethod
+    def __load_disk_cached_whois(
+        cache_key: Tuple[Hashable, ...]
+    ) -> Optional[_CachedWhois]:
+        """Loads the response of the query from the disk cache if it hasn't expired.
+
+        :param cache_key: The key of the response.
+        :return: The cached response or None if it isn't cached.
+        """
+        if not WHOIS_DISK_CACHE_TTL:
+            return None
+        cached = get_cached('whois', repr(cache_key), WHOIS_DISK_CACHE_TTL)
+        if not isinstance(cached, dict):
+            return None
         try:
-            while True:
-                data = sock.recv(4096)
-                if not data:
-                    break
-                self.__raw += data
-        except socket.error as ex:
-            log21.debug(
-                f'Error receiving data from "{RED}whois.iana.org:43{RESET}": '
-                f'{LRED}{ex.__class__.__name__}: {ex}{RESET}'
-            )
-            self.__error = (
-                'Error receiving data from "whois.iana.org:43": '
-                f'{ex.__class__.__name__}: {ex}', ex
+            return (
+                time.monotonic(), base64.b64decode(cached['raw']), cached['data'],
+                set(cached['servers'])
             )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Clears the in-memory cache of the WHOIS responses."""
+        with _whois_cache_lock:
+            _whois_cache.clear()
+
+    def __whois_iana(self):
+        tld, found = self.__get_cached_iana_server()
+        if found:
             return
-        sock.close()
 
-        # Checks if we received any data from the whois.iana.org server.
-        if not self.__raw:
-            log21.debug(f'{LRED}No data received.{RESET}')
-            self.__error = ('No data received from whois.iana.org.', None)
+        # Send a query to the whois.iana.org server to find the whois server for the
+        # domain.
+        self.__raw, self.__error = query_whois_server(
+            'whois.iana.org', self.__query, self.timeout, self.__throttle
+        )
+        if self.__error:
             return
 
+        self.__parse_iana_data(tld)
+
+    async def __whois_iana_async(self):
+        tld, found = self.__get_cached_iana_server()
+        if found:
+            return
+
+        self.__raw, self.__error = await query_whois_server_async(
+            'whois.iana.org', self.__query, self.timeout, self.__throttle
+        )
+        if self.__error:
+            return
+
+        self.__parse_iana_data(tld)
+
+    def __get_cached_iana_server(self) -> Tuple[Optional[str], bool]:
+        """Uses the cached whois server whois.iana.org referred the TLD of the domain
+        to.
+
+        :return: The TLD(None if the referral can't be cached) and whether the
+            referral was cached.
+        """
+        # IANA refers all the domains of a TLD to the same whois server, so the
+        # referrals of domains are cached by their TLD
+        domain = self.domain
+        if isinstance(domain, str) and '.' in domain and not validate_ip(domain):
+            tld = domain.rsplit('.', maxsplit=1)[-1]
+            server = _get_iana_server(tld)
+            if server is not None:
+                log21.debug(f'Using the cached whois server of {LCYAN}{tld}{RESET}.')
+                if server:
+                    self.__servers.add(server)
+                    self.__referred_server = server
+                return tld, True
+            return tld, False
+        return None, False
+
+    def __parse_iana_data(self, tld: Optional[str]):
+        """Extracts the whois server from the response of whois.iana.org and caches
+        it.
+
+        :param tld: The TLD to cache the whois server for(None to not cache it).
+        """
         log21.debug('Parsing data: Searching for whois server...')
-        # Parse the raw data from the whois.iana.org server and extract the whois
-        # server.
-        for line in self.__raw.decode(self.__get_decode_encoding(self.__raw),
-                                      errors=self.__encoding_errors).split('\n'):
-            if line.startswith('whois:'):
-                self.__servers.add(line[6:].strip())
-                break
+        # Only the "whois:" line of the raw data is decoded, since the rest of the
+        # response isn't used
+        match = _IANA_WHOIS_RE.search(self.__raw)
+        if match:
+            server = match.group(1).decode('ascii', errors='replace')
+            self.__servers.add(server)
+            self.__referred_server = server
         else:
+            server = ''
             log21.debug(f'{LRED}No whois server found.{RESET}')
             self.__error = ('No whois server found.', None)
             log21.debug('Trying to get another whois server...')
             self.__get_whois_server_for_tld()
             self.__error = None
 
+        if tld:
+            _set_iana_server(tld, server)
+
     def __get_whois_server_for_tld(self):
+        whois_servers = _get_whois_servers()
         if isinstance(self.domain, int):
             self.__servers.update((whois_servers['LNICHOST'], 'whois.arin.net'))
             return
-        tld = str(self.domain).rsplit('.', maxsplit=1)[-1]
+        tld = str(self.domain).rpartition('.')[2]
+        if not tld:
+            # The domain ends with a dot
+            return
         if tld.isdigit():
             if validate_ip(self.domain):
                 self.__servers.update((whois_servers['LNICHOST'], 'whois.arin.net'))
         else:
-            if tld in whois_servers:
-                self.__servers.update(whois_servers[tld])
-
-            self.__servers.add(tld + '.whois-servers.net')
-            self.__servers.add('whois.nic.' + tld)
-
-    # pylint: disable=too-many-branches, too-many-statements, too-many-nested-blocks
-    def __call_whois_servers(self):
-        # Get the whois information for the domain.
-        for whois_server in self.__servers:
-            if self.__call_whois_server(whois_server):
-                break
+            known, guessed = _get_tld_servers(tld)
+            self.__servers.update(known)
+            guessed = guessed - self.__servers
+            self.__servers.update(guessed)
+            self.__guessed_servers.update(guessed)
+
+    def __ordered_servers(self) -> List[str]:
+        """Returns the servers to query in order of preference. The server
+        whois.iana.org referred the domain to comes first, the servers that were
+        guessed from the TLD come last and the rest are ordered by their previous
+        success rates and latencies(see `_server_score`).
+
+        The servers aren't resolved here: each query resolves its own server and is
+        skipped if another server of the lookup has the same address(see
+        `_QueryGroup`), so the servers that can't be resolved don't delay the others.
+        """
+        return sorted(
+            self.__servers,
+            key=lambda server: (
+                server != self.__referred_server, server in self.__guessed_servers,
+                -_server_score(server)
+            )
+        )
 
-    def __call_whois_server(self, whois_server: str) -> bool:
-        """Call the whois server.
+    def __call_whois_servers(self, parallel: bool = True):
+        """Gets the whois information for the domain from the first server that
+        returns valid data.
 
-        :param whois_server: The whois server to call.
-        :return: True if the data was received and parsed successfully, False otherwise.
+        :param parallel: If True, all the servers are queried at the same time.
         """
-        # Create a socket connection to the whois server.
-        log21.debug(f'Connecting to {LBLUE}{whois_server}{RESET}...')
-        try:
-            sock = socket.create_connection((whois_server, 43))
-            sock.settimeout(self.timeout)
-        except socket.error as ex:
-            log21.debug(
-                f'Error connecting to "{RED}{whois_server}{RESET}": '
-                f'{LRED}{ex.__class__.__name__}: {ex}{RESET}'
-            )
-            self.__error = (
-                f'Error connecting to "{whois_server}": '
-                f'{ex.__class__.__name__}: {ex}', ex
-            )
-            return False
-        # Send the domain name to the whois server.
-        log21.debug(f'Sending query for {LCYAN}{self.domain}{RESET}...')
-        try:
-            sock.send(
-                str(self.domain
-                    ).encode(self.__encode_encoding, errors=self.__encoding_errors) +
-                b'\r\n'
-            )
-        except socket.error as ex:
-            log21.debug(
-                f'Error sending query to "{RED}{whois_server}{RESET}": '
-                f'{LRED}{ex.__class__.__name__}: {ex}{RESET}'
-            )
-            self.__error = (
-                f'Error sending query to "{whois_server}": '
-                f'{ex.__class__.__name__}: {ex}', ex
-            )
-            return False
-        # Receive the raw whois data from the whois server.
-        self.__raw = b''
-        log21.debug('Receiving data...')
+        if _debug_enabled():
+            log21.debug(f'Sending query for {LCYAN}{self.domain}{RESET}...')
+        servers = self.__ordered_servers()
+        group = _QueryGroup()
+        if not parallel or len(servers) == 1:
+            for whois_server in servers:
+                result = self.__call_whois_server(whois_server, group)
+                if _is_skipped(result[2]):
+                    continue
+                self.__raw, self.__whois_data, self.__error = result
+                if not self.__error:
+                    break
+            return
+
+        # The total time is the time of the fastest server instead of the sum of the
+        # times of the servers that fail before it. The best `WAVE_SIZE` servers are
+        # queried first and the rest only if they fail or take more than `WAVE_DELAY`
+        # seconds, so the servers that usually fail aren't queried for nothing
+        executor = ThreadPoolExecutor(
+            max_workers=len(servers), thread_name_prefix='whois21-whois'
+        )
+        pending = {
+            executor.submit(self.__call_whois_server, whois_server, group)
+            for whois_server in servers[:WAVE_SIZE]
+        }
+        rest = servers[WAVE_SIZE:]
+        deadline = time.monotonic() + WAVE_DELAY
         try:
-            while True:
-                data = sock.recv(4096)
-                if not data:
+            while pending:
+                done, pending = wait(
+                    pending,
+                    timeout=max(deadline - time.monotonic(), 0) if rest else None,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    result = future.result()
+                    if _is_skipped(result[2]):
+                        continue
+                    self.__raw, self.__whois_data, self.__error = result
+                    if not self.__error:
+                        return
+                if rest and (not pending or time.monotonic() >= deadline):
+                    pending.update(
+                        executor.submit(self.__call_whois_server, whois_server, group)
+                        for whois_server in rest
+                    )
+                    rest = []
+        finally:
+            # The queries that are still running are stopped, so their threads end
+            # right away instead of when they time out
+            group.stop()
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    async def __call_whois_servers_async(self, parallel: bool = True):
+        """Asynchronous version of `__call_whois_servers`.
+
+        :param parallel: If True, all the servers are queried at the same time.
+        """
+        if _debug_enabled():
+            log21.debug(f'Sending query for {LCYAN}{self.domain}{RESET}...')
+        servers = self.__ordered_servers()
+        group = _QueryGroup()
+        if not parallel or len(servers) == 1:
+            for whois_server in servers:
+                result = await self.__call_whois_server_async(whois_server, group)
+                if _is_skipped(result[2]):
+                    continue
+                self.__raw, self.__whois_data, self.__error = result
+                if not self.__error:
                     break
-                self.__raw += data
-        except socket.error as ex:
-            log21.debug(
-                f'Error receiving data from "{RED}{whois_server}{RESET}": '
-                f'{LRED}{ex.__class__.__name__}: {ex}{RESET}'
-            )
-            self.__error = (
-                f'Error receiving data from "{whois_server}": '
-                f'{ex.__class__.__name__}: {ex}', ex
-            )
-            return False
-        sock.close()
+            return
 
-        # Checks if we received any data from the whois server.
-        if not self.__raw:
-            log21.debug(f'No data received from {RED}{whois_server}{RESET}.')
-            self.__error = (f'No data received from {whois_server}.', None)
-            return False
+        loop = asyncio.get_running_loop()
+        pending = {
+            asyncio.ensure_future(self.__call_whois_server_async(whois_server, group))
+            for whois_server in servers[:WAVE_SIZE]
+        }
+        rest = servers[WAVE_SIZE:]
+        deadline = loop.time() + WAVE_DELAY
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(deadline - loop.time(), 0) if rest else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    result = task.result()
+                    if _is_skipped(result[2]):
+                        continue
+                    self.__raw, self.__whois_data, self.__error = result
+                    if not self.__error:
+                        return
+                if rest and (not pending or loop.time() >= deadline):
+                    pending.update(
+                        asyncio.ensure_future(
+                            self.__call_whois_server_async(whois_server, group)
+                        ) for whois_server in rest
+                    )
+                    rest = []
+        finally:
+            # Unlike the threads, the remaining queries can be cancelled
+            for task in pending:
+                task.cancel()
+
+    def __call_whois_server(
+        self,
+        whois_server: str,
+        group: Optional[_QueryGroup] = None
+    ) -> Tuple[bytes, dict, Optional[_Error]]:
+        """Call the whois server. Doesn't modify the object, so the servers can be
+        called concurrently.
+
+        :param whois_server: The whois server to call.
+        :param group: If given, the query stops when the queries of the group are
+            stopped and is skipped if another server of the group has the same
+            address.
+        :return: The raw data, the parsed whois data and the error(None if the data
+            was received and parsed successfully).
+        """
+        start = time.monotonic()
+        raw, error = query_whois_server(
+            whois_server, self.__query, self.timeout, self.__throttle, group
+        )
+        if error:
+            # The stopped and skipped queries don't say anything about the server
+            if not _is_skipped(error):
+                _record_server_query(whois_server, False, time.monotonic() - start)
+            return raw, {}, error
 
         # Parse the raw whois data from the whois server and extract the whois
         # information.
-        return self.__parse_whois_data()
+        data, error = self.__parse_whois_data(raw)
+        _record_server_query(whois_server, not error, time.monotonic() - start)
+        return raw, data, error
+
+    async def __call_whois_server_async(
+        self,
+        whois_server: str,
+        group: Optional[_QueryGroup] = None
+    ) -> Tuple[bytes, dict, Optional[_Error]]:
+        """Asynchronous version of `__call_whois_server`.
 
-    def __parse_whois_data(self):
+        :param whois_server: The whois server to call.
+        :param group: If given, the query is skipped if another server of the group
+            has the same address.
+        :return: The raw data, the parsed whois data and the error(None if the data
+            was received and parsed successfully).
+        """
+        start = time.monotonic()
+        raw, error = await query_whois_server_async(
+            whois_server, self.__query, self.timeout, self.__throttle, group
+        )
+        if error:
+            if not _is_skipped(error):
+                _record_server_query(whois_server, False, time.monotonic() - start)
+            return raw, {}, error
+
+        data, error = self.__parse_whois_data(raw)
+        _record_server_query(whois_server, not error, time.monotonic() - start)
+        return raw, data, error
+
+    def __parse_whois_data(self, raw: bytes) -> Tuple[dict, Optional[_Error]]:
         """Parse the raw whois data.
 
-        :return: True if the data was parsed successfully, False otherwise.
+        :param raw: The raw whois data.
+        :return: The parsed data and the error(None if the data was parsed
+            successfully).
         """
         log21.debug('Parsing data...')
-        data = self.__whois_data = {}
-        i = 0
-        lines = self.__raw.decode(
-            self.__get_decode_encoding(self.__raw), errors=self.__encoding_errors
-        ).split('\n')
-        while i < len(lines):
-            line = lines[i]
-            if line.startswith('%') or line.startswith('#'):
-                i += 1
-                continue
-            if ':' in line:
-                key_name, value = line.split(':', 1)
-                if not value:
-                    value = ''
-                    for j in range(i + 1, len(lines)):
-                        if lines[j].startswith('%') or lines[j].startswith('#'):
-                            continue
-                        if ':' in lines[j]:
-                            break
-                        value += lines[j].strip(STRIP_CHARS) + '\n'
-                        i = j
-                if (key := key_name.strip(STRIP_CHARS).upper()) not in data:
-                    data[key] = value.strip(STRIP_CHARS)
+        data: Dict[str, Any] = {}
+        text = raw.decode(
+            self.__get_decode_encoding(raw), errors=self.__encoding_errors
+        )
+        if '\r' in text:
+            # Most servers end the lines with CRLF. A "Key:\r" line would otherwise
+            # look like a key with a value and lose the value lines after it
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        for key_name, value, value_lines in _KEY_VALUE_RE.findall(text):
+            if not value:
+                # The value is in the next lines(until the next key)
+                value = '\n'.join(
+                    line.strip(STRIP_CHARS) for line in value_lines.split('\n')[1:]
+                    if not line.startswith(COMMENT_PREFIXES)
+                )
+            # The same keys appear in most responses, so they are interned to share
+            # one string object between all of them
+            key = sys.intern(key_name.strip(STRIP_CHARS).upper())
+            value = value.strip(STRIP_CHARS)
+            current = data.get(key)
+            if current is None:
+                data[key] = value
+            elif value:
+                if isinstance(current, list):
+                    current.append(value)
                 else:
-                    if (value := value.strip(STRIP_CHARS)):
-                        if isinstance(data[key], list):
-                            data[key].append(value)
-                        elif isinstance(data[key], str):
-                            data[key] = [data[key], value]
-            i += 1
+                    data[key] = [current, value]
 
         if not data:
             log21.debug(f'{LRED}No data found.')
-            self.__error = ('No whois data found.', None)
-            return False
+            return data, ('No whois data found.', None)
 
         # Check if the whois server returned any error messages.
         if 'ERROR' in data or 'WHOIS ERROR' in data:
             log21.debug(f'{LRED}Error{RESET} found in whois data.')
-            self.__error = ('Error found in whois data.', None)
-            return False
+            return data, ('Error found in whois data.', None)
 
-        self.__error = None
-        return True
+        return data, None
 
     def __rdap(self):
         # Get the rdap information for the domain.
@@ -672,8 +1378,31 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         :param prefix: The prefix to use for the key.
         :param entity_: The entity dictionary.
         """
-        prefix += entity_.get('roles', [''])[0]
-        prefix = prefix.strip().upper()
+        # The nested entities are handled with a stack instead of recursion, in the
+        # same order
+        whois_data = self.__whois_data
+        vcard_map = _get_vcard_map()
+        stack = [(prefix, entity_)]
+        while stack:
+            prefix, entity_ = stack.pop()
+            prefix = (prefix + entity_.get('roles', [''])[0]).strip().upper()
+            self.__handle_entity_data(whois_data, vcard_map, prefix, entity_)
+            stack.extend(
+                (prefix, _entity) for _entity in reversed(entity_.get('entities', []))
+            )
+
+    @staticmethod
+    def __handle_entity_data(
+        whois_data: Dict[str, Any], vcard_map: Dict[str, str], prefix: str,
+        entity_: dict
+    ):
+        """Puts the public ids and the vCard properties of an entity in the WHOIS data.
+
+        :param whois_data: The WHOIS data.
+        :param vcard_map: The map of the vCard properties to WHOIS keys.
+        :param prefix: The prefix of the keys.
+        :param entity_: The entity dictionary.
+        """
         for public_id in entity_.get('publicIds', []):
             # Example:
             # "publicIds": [
@@ -683,8 +1412,8 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
             #     }
             # ]
             if 'type' in public_id and 'identifier' in public_id:
-                self.__whois_data[public_id.get('type').upper()
-                                  ] = public_id.get('identifier')
+                whois_data[sys.intern(public_id['type'].upper())
+                           ] = public_id['identifier']
 
         # Handle vcards
         # Reference: https://www.rfc-editor.org/rfc/rfc6350.txt
@@ -707,22 +1436,20 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         #                       ]
         #                   ]
         #               ]
+        prefix += ' '
         for vcard in entity_.get('vcardArray', ['vcard', []])[1]:
             data = vcard[3]
-            temp = []
             if isinstance(data, list):
-                for part in data:
-                    if part:
-                        temp.append(str(part))
-            data = ' '.join(temp)
-
-            if vcard[0] in vcard_map:
-                self.__whois_data[prefix + ' ' + vcard_map[vcard[0]]] = data
-            elif vcard[0] != 'version':
-                self.__whois_data[prefix + ' ' + vcard[0].upper()] = data
+                data = ' '.join([str(part) for part in data if part])
+            else:
+                data = ''
 
-        for _entity in entity_.get('entities', []):
-            self.__handle_entity(prefix, _entity)
+            name = vcard[0]
+            key = vcard_map.get(name)
+            if key is not None:
+                whois_data[sys.intern(prefix + key)] = data
+            elif name != 'version':
+                whois_data[sys.intern(prefix + name.upper())] = data
 
     def __parse_rdap_data(self):
         """Parses the RDAP data and puts some information in whois_data dictionary."""
@@ -758,11 +1485,26 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
 
         self.__success = True
 
-    def __get_decode_encoding(self, data) -> str:
+    def __get_decode_encoding(self, data: bytes) -> str:
         if self.__decode_encoding:
             return self.__decode_encoding
-        encoding = chardet.detect(data)['encoding']
-        return encoding if encoding else 'utf-8'
+        # The encoding of the same data is only detected once(e.g. for parsing it and
+        # for `__str__`)
+        detected_data, encoding = self.__detected_encoding
+        if detected_data is data:
+            return encoding
+        # Most responses are plain ASCII or UTF-8, which are checked much faster than
+        # chardet detects them
+        if data.isascii():
+            encoding = 'ascii'
+        else:
+            try:
+                data.decode('utf-8')
+                encoding = 'utf-8'
+            except UnicodeDecodeError:
+                encoding = _get_chardet().detect(data)['encoding'] or 'utf-8'
+        self.__detected_encoding = (data, encoding)
+        return encoding
 
     @property
     def whois_data(self) -> Dict[str, Any]:
@@ -820,18 +1562,203 @@ class WHOIS:  # pylint: disable=too-many-instance-attributes
         return self.__whois_data[key.upper()]
 
 
-def registration_data_lookup(domain: Union[str, int], timeout: int = 10) -> dict:
+class AsyncWHOIS(WHOIS):
+    """Asynchronous WHOIS client.
+
+    The query runs when the object is awaited in an `async with` statement or when
+    `whois_async` is awaited:
+
+    >>> async with AsyncWHOIS('example.com') as whois:
+    ...     print(whois.creation_date)
+    """
+
+    def __init__(self, domain: str, **kwargs):
+        """Initialize AsyncWHOIS object.
+
+        :param domain: Domain name/IP to query.
+        :param kwargs: The other arguments of `WHOIS.whois`, used by `async with`.
+        """
+        kwargs.pop('run_whois', None)
+        super().__init__(domain, run_whois=False, **kwargs)
+        self.__kwargs = kwargs
+
+    async def whois_async(self, domain: Optional[str] = None, **kwargs) -> 'AsyncWHOIS':
+        """Queries the whois server for the domain.
+
+        :param domain: The domain/ip to query.
+        :param kwargs: The other arguments of `WHOIS.whois`.
+        :return: The AsyncWHOIS object.
+        """
+        await super().whois_async(domain, **kwargs)
+        return self
+
+    async def __aenter__(self) -> 'AsyncWHOIS':
+        return await self.whois_async(**self.__kwargs)
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return None
+
+
+async def bulk_whois_async(
+    domains: Iterable[str],
+    *,
+    concurrency: int = 1000,
+    per_server_qps: Optional[float] = 1.0,
+    **kwargs
+) -> Dict[str, AsyncWHOIS]:
+    """Asynchronous version of `bulk_whois`.
+
+    The domains are queried in one thread, so much higher concurrency than the
+    threads of `bulk_whois` is possible.
+
+    :param domains: The domains/ips to query.
+    :param concurrency: The maximum number of domains queried at the same time.
+    :param per_server_qps: The maximum number of queries sent to each WHOIS server per
+        second. None disables the limit. (default: 1.0)
+    :param kwargs: The other arguments of `WHOIS.whois`.
+    :return: A dictionary mapping each domain to its AsyncWHOIS object.
+    """
+    domains = list(dict.fromkeys(domains))
+    kwargs.setdefault('parallel', False)
+    if per_server_qps:
+        kwargs.setdefault('throttle', ServerThrottle(per_server_qps))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def lookup(domain: str) -> AsyncWHOIS:
+        async with semaphore:
+            return await AsyncWHOIS(domain).whois_async(**kwargs)
+
+    return dict(zip(domains, await asyncio.gather(*map(lookup, domains))))
+
+
+def bulk_whois(
+    domains: Iterable[str],
+    *,
+    concurrency: int = 32,
+    per_server_qps: Optional[float] = 1.0,
+    **kwargs
+) -> Dict[str, WHOIS]:
+    """Queries the WHOIS servers for many domains concurrently without flooding them.
+
+    The domains of different TLDs(which are served by different WHOIS servers) are
+    interleaved so the workers don't all wait for the same server, and each server is
+    sent at most `per_server_qps` queries per second. The servers of each domain are
+    queried one by one unless `parallel=True` is passed.
+
+    :param domains: The domains/ips to query.
+    :param concurrency: The maximum number of domains queried at the same time.
+    :param per_server_qps: The maximum number of queries sent to each WHOIS server per
+        second. None disables the limit. (default: 1.0)
+    :param kwargs: The other arguments of `WHOIS`.
+    :return: A dictionary mapping each domain to its WHOIS object.
+    """
+    groups: Dict[str, List[str]] = {}
+    for domain in dict.fromkeys(domains):
+        tld = str(domain).rsplit('.', maxsplit=1)[-1].lower()
+        groups.setdefault(tld, []).append(domain)
+    if not groups:
+        return {}
+    ordered = [
+        domain for batch in itertools.zip_longest(*groups.values()) for domain in batch
+        if domain is not None
+    ]
+
+    kwargs.setdefault('parallel', False)
+    if per_server_qps:
+        kwargs.setdefault('throttle', ServerThrottle(per_server_qps))
+
+    def lookup(domain: str) -> WHOIS:
+        return WHOIS(domain, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(ordered)),
+                            thread_name_prefix='whois21-bulk') as executor:
+        return dict(zip(ordered, executor.map(lookup, ordered)))
+
+
+def registration_data_lookup(
+    domain: Union[str, int],
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> dict:
     """Lookup the registration data for a Domain Name/IP Address/AS Number.
 
     :param domain: The domain/ip/ans to lookup.
     :param timeout: The timeout for the socket connection.
+    :param fields: If given, only these keys of the registration data are returned.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
     :return: A WHOIS object.
     """
     if validate_ip(domain):
-        return ip_registration_data_lookup(domain, timeout)
+        return ip_registration_data_lookup(domain, timeout, fields, cache_ttl)
     if validate_asn(domain):
-        return asn_registration_data_lookup(domain, timeout)
+        return asn_registration_data_lookup(domain, timeout, fields, cache_ttl)
     # If the `domain` variable is an isinstance of int then it would have passed the
     # `validate_asn` check and the function would have returned. Therefore, we can
     # assume that the `domain` variable is an isinstance of str.
-    return domain_registration_data_lookup(domain, timeout)  # type: ignore
+    return domain_registration_data_lookup(  # type: ignore
+        domain, timeout, fields, cache_ttl
+    )
+
+
+async def registration_data_lookup_async(
+    domain: Union[str, int],
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None
+) -> dict:
+    """Asynchronous version of `registration_data_lookup`.
+
+    :param domain: The domain/ip/ans to lookup.
+    :param timeout: The timeout for the requests.
+    :param fields: If given, only these keys of the registration data are returned.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
+    :return: A dictionary containing the registration data.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, registration_data_lookup, domain, timeout, fields, cache_ttl
+    )
+
+
+def bulk_registration_data_lookup(
+    domains: Iterable[Union[str, int]],
+    timeout: int = 10,
+    fields: Optional[Iterable[str]] = None,
+    cache_ttl: Optional[int] = None,
+    max_workers: int = 16
+) -> Dict[Union[str, int], dict]:
+    """Looks up the registration data of many Domain Names/IP Addresses/AS Numbers
+    concurrently.
+
+    The requests share the pooled HTTP session(so the connections to each RDAP server
+    are reused) and at most `RDAP.MAX_REQUESTS_PER_HOST` requests are sent to each RDAP
+    server at the same time.
+
+    :param domains: The domains/ips/asns to lookup.
+    :param timeout: The timeout for each request.
+    :param fields: If given, only these keys of the registration data are returned.
+    :param cache_ttl: The number of seconds the registration data is cached on disk
+        for(default: the value of the `WHOIS21_CACHE_TTL` environment variable). 0
+        disables the cache.
+    :param max_workers: The maximum number of lookups running at the same time.
+    :return: A dictionary mapping each domain/ip/asn to its registration data.
+    """
+    if fields is not None:
+        fields = tuple(fields)
+    unique = list(dict.fromkeys(domains))
+    if not unique:
+        return {}
+
+    def lookup(domain: Union[str, int]) -> dict:
+        return registration_data_lookup(domain, timeout, fields, cache_ttl)
+
+    # The lookups wait for the requests they send to the shared RDAP thread pool, so
+    # they can't run in that pool themselves
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique)),
+                            thread_name_prefix='whois21-bulk') as executor:
+        return dict(zip(unique, executor.map(lookup, unique)))
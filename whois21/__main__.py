@@ -1,36 +1,170 @@
 # whois21.__main__.py
 
 import os
-import json
+import sys
+import shutil
+import tempfile
+import itertools
+import contextlib
+from typing import (Any, Set, Dict, Deque, Tuple, TextIO, BinaryIO, Callable, Iterable,
+                    Iterator, Optional)
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
 
 import log21
 
 import whois21
+from whois21 import JSON
+from whois21.Cache import TTL_ENV_VAR, clear_cache
 
+# Replaces the characters that aren't allowed in filenames
+_INVALID_FILENAME_CHARS = str.maketrans(dict.fromkeys('<>:"/\\|?*', '_'))
 
-def get_filename(directory: str, domain: str, format_: str = 'json') -> str:
+
+def get_filename(
+    directory: str,
+    domain: str,
+    format_: str = 'json',
+    existing: Optional[Set[str]] = None
+) -> str:
     """Gets a filename to store the registration data in.
 
     :param directory: The directory to store the registration data in.
     :param domain: The domain to get the name for.
     :param format_: The format to store the registration data in.
+    :param existing: The names of the files in the directory. If given, the names are
+        checked against it instead of the directory and the chosen name is added to
+        it.
     :return: The filename.
     """
-    name = domain + '.' + format_
     # Remove invalid characters
-    for char in '<>:"/\\|?*':
-        name = name.replace(char, '_')
+    domain = domain.translate(_INVALID_FILENAME_CHARS)
+    name = domain + '.' + format_
 
     i = 2
     filename = os.path.join(directory, name)
-    while os.path.exists(filename):
+    while (name in existing) if existing is not None else os.path.exists(filename):
         name = f'{domain}-{i}.{format_}'
         filename = os.path.join(directory, name)
         i += 1
 
+    if existing is not None:
+        existing.add(name)
     return filename
 
 
+# Maps the formats of the output files to the functions that write the data to them.
+# The data is written while it is serialized, so the whole document isn't kept in
+# memory twice.
+_WRITERS: Dict[str, Callable[[Any, BinaryIO], Any]] = {
+    'txt': lambda data, file: file.write(data),
+    'json': lambda data, file: JSON.dump(data, file, indent=True),
+    'msgpack': lambda data, file: msgpack.pack(data, file, use_bin_type=True),
+    'cbor': lambda data, file: cbor2.dump(data, file)
+}
+
+
+@contextlib.contextmanager
+def create_file(
+    directory: str,
+    domain: str,
+    format_: str = 'json',
+    existing: Optional[Set[str]] = None
+) -> Iterator[Tuple[str, BinaryIO]]:
+    """Creates a new file to store the registration data in.
+
+    The name is reserved by creating the file exclusively, so a file created by
+    another program after its name was chosen is never overwritten. The data is
+    written to a temporary file that replaces the reserved file when the block exits,
+    so an interrupted write never leaves a truncated file behind.
+
+    :param directory: The directory to store the registration data in.
+    :param domain: The domain to create the file for.
+    :param format_: The format to store the registration data in.
+    :param existing: The names of the files in the directory(see `get_filename`).
+    :return: A context manager that gives the filename and the temporary file opened
+        for writing in binary mode.
+    """
+    while True:
+        filename = get_filename(directory, domain, format_, existing)
+        try:
+            with open(filename, 'xb'):
+                break
+        except FileExistsError:
+            # The name is already reserved, so the next name is tried
+            continue
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.whois21-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            yield filename, file
+        # The temporary file is only readable by the user, unlike the reserved file
+        shutil.copymode(filename, temp_path)
+        os.replace(temp_path, filename)
+    except BaseException:
+        os.remove(temp_path)
+        os.remove(filename)
+        raise
+
+
+def read_domains(file: TextIO) -> Iterator[str]:
+    """Reads the domains to lookup from a file, one per line. Empty lines are skipped.
+
+    :param file: The file to read the domains from(e.g. `sys.stdin`).
+    :return: An iterator of the domains.
+    """
+    for line in file:
+        domain = line.strip()
+        if domain:
+            yield domain
+
+
+def lookup_concurrently(
+    domains: Iterable[str], lookup: Callable[[str], Any], concurrency: int
+) -> Iterator[Tuple[str, Any]]:
+    """Looks up the domains concurrently and yields the results in the order of the
+    domains as soon as they are ready.
+
+    At most `2 * concurrency` lookups are submitted ahead of the result being
+    waited for, so the memory used doesn't grow with the number of domains and the
+    domains are only read from `domains` as they are needed.
+
+    :param domains: The domains to lookup.
+    :param lookup: The function that looks up a domain.
+    :param concurrency: The maximum number of domains looked up at the same time.
+    :return: An iterator of (domain, result) tuples.
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix='whois21-cli'
+    )
+    pending: Deque[Tuple[str, Future]] = deque()
+    try:
+        for domain in domains:
+            pending.append((domain, executor.submit(lookup, domain)))
+            if len(pending) >= 2 * concurrency:
+                domain, future = pending.popleft()
+                yield domain, future.result()
+        while pending:
+            domain, future = pending.popleft()
+            yield domain, future.result()
+    finally:
+        # The lookups that haven't started yet are cancelled if the program is
+        # interrupted
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
 def main():
     """The main function."""
     parser = log21.ColorizingArgumentParser()
@@ -51,6 +185,40 @@ def main():
         default=10,
         help='The time out for the WHOIS request(default=10).'
     )
+    parser.add_argument(
+        '-s',
+        '--stdin',
+        action='store_true',
+        help='Read the domains/ips to lookup from the standard input, one per line, '
+        'after the ones given as arguments.'
+    )
+    parser.add_argument(
+        '-c',
+        '--concurrency',
+        type=int,
+        default=16,
+        help='The maximum number of domains looked up at the same time(default=16).'
+    )
+    parser.add_argument(
+        '-ct',
+        '--cache-ttl',
+        type=int,
+        help='The number of seconds the WHOIS and RDAP responses are cached on disk '
+        'for(default: the RDAP responses are cached for a day and the WHOIS responses '
+        'aren\'t cached).'
+    )
+    parser.add_argument(
+        '-nc',
+        '--no-cache',
+        action='store_true',
+        help='Don\'t use the cached responses.'
+    )
+    parser.add_argument(
+        '-cc',
+        '--clear-cache',
+        action='store_true',
+        help='Remove the cached responses from the disk before the lookups.'
+    )
     parser.add_argument(
         '-t',
         '--tree-print',
@@ -58,6 +226,13 @@ def main():
         help='Print the registration data in a tree format.'
     )
     parser.add_argument('-o', '--output', help='The output folder.', type=str)
+    parser.add_argument(
+        '-f',
+        '--format',
+        choices=('json', 'msgpack', 'cbor'),
+        default='json',
+        help='The format of the files saved in the output folder(default=json).'
+    )
     parser.add_argument(
         '-R', '--raw', action='store_true', help='Print/save the raw whois data.'
     )
@@ -91,6 +266,26 @@ def main():
         parser.error('Cannot use both -R and -t.')
     if args.registration_data and args.ip_api:
         parser.error('Cannot use both -r and -i.')
+    if args.format == 'msgpack' and msgpack is None:
+        parser.error('-f msgpack requires the msgpack package.')
+    if args.format == 'cbor' and cbor2 is None:
+        parser.error('-f cbor requires the cbor2 package.')
+    if args.concurrency < 1:
+        parser.error('-c must be at least 1.')
+    if args.no_cache and args.cache_ttl is not None:
+        parser.error('Cannot use both -ct and -nc.')
+    if args.cache_ttl is not None and args.cache_ttl < 0:
+        parser.error('-ct must not be negative.')
+
+    if args.no_cache:
+        args.cache_ttl = 0
+    if args.cache_ttl is not None:
+        whois21.WHOIS_DISK_CACHE_TTL = args.cache_ttl
+        # The RDAP responses and the WHOIS server referrals use this TTL
+        os.environ[TTL_ENV_VAR] = str(args.cache_ttl)
+    if args.clear_cache:
+        clear_cache()
+        log21.info('Cleared the cache.')
 
     if args.raw and args.registration_data:
         log21.warn('-R will not effect results from -r.')
@@ -108,68 +303,80 @@ def main():
     else:
         print_result = log21.pprint
 
+    # The names of the files in the output folder, so the folder is only listed once
+    existing: Set[str] = set()
     if args.output:
         os.makedirs(args.output, exist_ok=True)
+        existing = {entry.name for entry in os.scandir(args.output)}
 
-    if args.domains:
+    if args.domains or args.stdin:
+        # The standard input is read while the lookups run, so the lookups start
+        # before all the domains are known
+        domains: Iterable[str] = args.domains
+        if args.stdin:
+            domains = itertools.chain(args.domains, read_domains(sys.stdin))
+
+        # Each lookup returns the object to print, the data to save and the format of
+        # the data('txt' for the raw WHOIS data) or an error message, None and None
         if args.raw and not args.registration_data and not args.ip_api:
-            for domain in args.domains:
+
+            def lookup(domain: str) -> Tuple[Any, Any, Optional[str]]:
                 log21.info(f'Looking up {domain}...')
                 result = whois21.WHOIS(domain, timeout=args.timeout)
                 if result.raw:
-                    if not args.no_print:
-                        print(result)
-                    if args.output:
-                        filename = get_filename(args.output, domain, 'txt')
-                        with open(filename, 'wb') as file:
-                            file.write(result.raw)
-                        log21.info(f'Saved whois data to {filename}.')
-                elif result.whois_data:
-                    if not args.no_print:
-                        print_result(result.whois_data)
-                    if args.output:
-                        filename = get_filename(args.output, domain, 'json')
-                        with open(filename, 'w', encoding='utf-8') as file:
-                            json.dump(result.whois_data, file, indent=4)
-                        log21.info(f'Saved whois data to {filename}.')
-                elif result.error:
-                    log21.error(result.error)
-                else:
-                    log21.error(f'Unknown error for {domain}.')
+                    return result, result.raw, 'txt'
+                if result.whois_data:
+                    return result.whois_data, result.whois_data, args.format
+                return result.error or f'Unknown error for {domain}.', None, None
+
+            saved_message = 'Saved whois data to {}.'
+        elif args.ip_api:
+
+            def lookup(domain: str) -> Tuple[Any, Any, Optional[str]]:
+                log21.info(f'Looking up {domain}...')
+                result = whois21.lookup_ip_ip_api(domain, timeout=args.timeout)
+                return result, result, args.format
+
+            saved_message = 'Saved registration data to {}.'
+        elif args.registration_data:
+
+            def lookup(domain: str) -> Tuple[Any, Any, Optional[str]]:
+                log21.info(f'Looking up registration data for {domain}...')
+                result = whois21.WHOIS(
+                    domain, timeout=args.timeout, force_rdap=True
+                ).rdap_data
+                return result, result, args.format
+
+            saved_message = 'Saved registration data to {}.'
         else:
-            if args.ip_api:
-                for domain in args.domains:
-                    log21.info(f'Looking up {domain}...')
-                    result = whois21.lookup_ip_ip_api(domain, timeout=args.timeout)
-                    print_result(result)
-                    if args.output:
-                        filename = get_filename(args.output, domain)
-                        with open(filename, 'w', encoding='utf-8') as file:
-                            json.dump(result, file, indent=4)
-                        log21.info(f'Saved registration data to {filename}.')
-            elif args.registration_data:
-                for domain in args.domains:
-                    log21.info(f'Looking up registration data for {domain}...')
-                    result = whois21.WHOIS(
-                        domain, timeout=args.timeout, force_rdap=True
-                    ).rdap_data
-                    print_result(result)
-                    if args.output:
-                        filename = get_filename(args.output, domain)
-                        with open(filename, 'w', encoding='utf-8') as file:
-                            json.dump(result, file, indent=4)
-                        log21.info(f'Saved registration data to {filename}.')
-            else:
-                for domain in args.domains:
-                    log21.info(f'Looking up {domain}...')
-                    result = whois21.WHOIS(domain, timeout=args.timeout).whois_data
-                    print_result(result)
-                    if args.output:
-                        filename = get_filename(args.output, domain)
-                        with open(filename, 'w', encoding='utf-8') as file:
-                            json.dump(result, file, indent=4)
-                        log21.info(f'Saved whois data to {filename}.')
-    else:
+
+            def lookup(domain: str) -> Tuple[Any, Any, Optional[str]]:
+                log21.info(f'Looking up {domain}...')
+                result = whois21.WHOIS(domain, timeout=args.timeout).whois_data
+                return result, result, args.format
+
+            saved_message = 'Saved whois data to {}.'
+
+        # Maps the formats of the results to the functions that print them
+        printers = {
+            args.format: print_result,
+            'txt': print_result if args.no_print else print
+        }
+
+        # The lookups run concurrently, but the results are printed and saved in the
+        # order of the domains
+        for domain, (shown, data, format_) in lookup_concurrently(domains, lookup,
+                                                                  args.concurrency):
+            if format_ is None:
+                log21.error(shown)
+                continue
+            printers[format_](shown)
+            if args.output:
+                with create_file(args.output, domain, format_,
+                                 existing) as (filename, file):
+                    _WRITERS[format_](data, file)
+                log21.info(saved_message.format(filename))
+    elif not args.clear_cache:
         parser.print_help()
 
 